@@ -9,15 +9,14 @@ from db import (
     fetch_account_statement_by_id,
     fetch_renewal_notice_by_id
 )
-import io
+import hashlib
+from collections import OrderedDict
 import sys
 import os
+import shutil
+import tempfile
 import webbrowser
 import threading
-import fitz
-from PIL import Image
-import numpy as np
-import easyocr
 
 if getattr(sys, 'frozen', False):
     # Running from PyInstaller bundle
@@ -32,44 +31,82 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB
 
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'xlsx', 'txt'}
 
+# Default main_data keys shared by the create/edit templates; never
+# mutated, only copied per request.
+_DOC_DEFAULTS = {
+    "issue_date": "",
+    "insured_or_agent": "",
+    "insured": "",
+    "insurance_class": "",
+    "policy_number": "",
+    "endorsement_number": "",
+    "account_number": "",
+    "expiry_date": "",
+    "ac_code": "",
+    "total_earning": 0,
+    "renewal_premium": 0,
+    "uploaded_by": "",
+    "file_name": "",
+    "file_data": None,
+}
+
 
 # ---------------- HELPERS ----------------
 def allowed_file(filename):
-    return (
-        filename and
-        '.' in filename and
-        filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-    )
+    if not filename:
+        return False
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in ALLOWED_EXTENSIONS
+
+
+def file_etag(doc_type, doc_id, size):
+    return hashlib.blake2b(
+        f"{doc_type}:{doc_id}:{size}".encode(),
+        digest_size=8
+    ).hexdigest()
 
 
-def first(form, key, default=''):
-    return form.get(key, [default])[0]
+def read_upload(file):
+    """
+    Drain an uploaded file in 64 KB chunks through a spooled temp file,
+    so large uploads spill to disk instead of accumulating in RAM while
+    the socket is read. Returns the bytes for the BLOB insert.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=1 << 20) as spool:
+        shutil.copyfileobj(file.stream, spool, length=65536)
+        spool.seek(0)
+        return spool.read()
 
 
 # ---------------- DOWNLOAD FILE ----------------
 @app.route('/download/<doc_type>/<int:doc_id>')
 def download_file(doc_type, doc_id):
-    if doc_type == 'debit_note':
-        doc = fetch_debit_note_by_id(doc_id)
-    elif doc_type == 'account_statement':
-        doc = fetch_account_statement_by_id(doc_id)
-    elif doc_type == 'renewal_notice':
-        doc = fetch_renewal_notice_by_id(doc_id)
-    else:
+    from db import open_file_blob
+
+    if doc_type not in ('debit_note', 'account_statement', 'renewal_notice'):
         return "Unknown document type", 400
 
-    if not doc:
+    blob, file_name = open_file_blob(doc_type, doc_id)
+    if blob is None:
         return "File not found", 404
-    if not doc.get('file_data'):
-        return "No file attached", 404
 
-    filename = doc.get('file_name') or f"{doc_type}_{doc_id}.bin"
+    etag = file_etag(doc_type, doc_id, len(blob))
+    if request.headers.get('If-None-Match') == etag:
+        blob.close()
+        return '', 304
+
+    filename = file_name or f"{doc_type}_{doc_id}.bin"
 
-    return send_file(
-        io.BytesIO(doc['file_data']),
+    resp = send_file(
+        blob,
         as_attachment=True,
         download_name=filename
     )
+    resp.headers['ETag'] = etag
+    resp.headers['Cache-Control'] = 'private, max-age=3600'
+    # keep the blob open until the last chunk is on the wire
+    resp.call_on_close(blob.close)
+    return resp
 
 
 # ---------------- INDEX ----------------
@@ -113,31 +150,13 @@ def index():
 def create_doc(doc_type):
     if request.method == 'GET':
         # Provide full default main_data to avoid NoneType errors in template
-        main_data = {
-            "issue_date": "",
-            "insured_or_agent": "",
-            "insured": "",
-            "insurance_class": "",
-            "policy_number": "",
-            "endorsement_number": "",
-            "account_number": "",
-            "expiry_date": "",
-            "ac_code": "",
-            "total_earning": 0,
-            "renewal_premium": 0,
-            "uploaded_by": "",
-            "file_name": "",
-            "file_data": None,
-            "financials": [],
-            "entries": []
-        }
+        main_data = {**_DOC_DEFAULTS, "financials": [], "entries": []}
         return render_template(
             'create.html',
             doc_type=doc_type or "",
             main_data=main_data
         )
 
-    form = request.form.to_dict(flat=False)
     file = request.files.get('document_file')
 
     file_name = None
@@ -147,36 +166,43 @@ def create_doc(doc_type):
         if not allowed_file(file.filename):
             return "Invalid file type", 400
         file_name = file.filename
-        file_data = file.read()
+        file_data = read_upload(file)
 
     try:
-        uploaded_by = first(form, 'uploaded_by', '')
+        uploaded_by = request.form.get('uploaded_by', '')
 
         # -------- DEBIT NOTE --------
         if doc_type == 'debit_note':
             main_data = {
-                'issue_date': first(form, 'issue_date', ''),
-                'insured_or_agent': first(form, 'insured_or_agent', ''),
-                'insurance_class': first(form, 'insurance_class', ''),
-                'policy_number': first(form, 'policy_number', ''),
-                'endorsement_number': first(form, 'endorsement_number', ''),
-                'account_number': first(form, 'account_number', ''),
+                'issue_date': request.form.get('issue_date', ''),
+                'insured_or_agent': request.form.get('insured_or_agent', ''),
+                'insurance_class': request.form.get('insurance_class', ''),
+                'policy_number': request.form.get('policy_number', ''),
+                'endorsement_number': request.form.get('endorsement_number', ''),
+                'account_number': request.form.get('account_number', ''),
                 'uploaded_by': uploaded_by,
                 'file_name': file_name,
                 'file_data': file_data
             }
 
             financials = []
-            for i, category in enumerate(form.get('category[]', [])):
+            for category, gross, comm, ovr, cost, profit in zip(
+                request.form.getlist('category[]'),
+                request.form.getlist('gross_premium[]'),
+                request.form.getlist('commission[]'),
+                request.form.getlist('overriding_insurer[]'),
+                request.form.getlist('cost[]'),
+                request.form.getlist('profit[]')
+            ):
                 if not category.strip():
                     continue
                 financials.append({
                     'category': category,
-                    'gross_premium': form.get('gross_premium[]', [''])[i],
-                    'commission': form.get('commission[]', [''])[i],
-                    'overriding_insurer': form.get('overriding_insurer[]', [''])[i],
-                    'cost': form.get('cost[]', [''])[i],
-                    'profit': form.get('profit[]', [''])[i]
+                    'gross_premium': gross,
+                    'commission': comm,
+                    'overriding_insurer': ovr,
+                    'cost': cost,
+                    'profit': profit
                 })
 
             insert_debit_note(main_data, financials)
@@ -184,25 +210,30 @@ def create_doc(doc_type):
         # -------- ACCOUNT STATEMENT --------
         elif doc_type == 'account_statement':
             main_data = {
-                'issue_date': first(form, 'issue_date', ''),
-                'address': first(form, 'address', ''),
-                'account_number': first(form, 'account_number', ''),
-                'total_premium_due': first(form, 'total_premium_due', ''),
-                'premium_due_date': first(form, 'premium_due_date', ''),
+                'issue_date': request.form.get('issue_date', ''),
+                'address': request.form.get('address', ''),
+                'account_number': request.form.get('account_number', ''),
+                'total_premium_due': request.form.get('total_premium_due', ''),
+                'premium_due_date': request.form.get('premium_due_date', ''),
                 'uploaded_by': uploaded_by,
                 'file_name': file_name,
                 'file_data': file_data
             }
 
             entries = []
-            for i, eff in enumerate(form.get('effective_date[]', [])):
+            for eff, debit, policy, premium in zip(
+                request.form.getlist('effective_date[]'),
+                request.form.getlist('debit_note[]'),
+                request.form.getlist('policy_number[]'),
+                request.form.getlist('premium[]')
+            ):
                 if not eff.strip():
                     continue
                 entries.append({
                     'effective_date': eff,
-                    'debit_note': form.get('debit_note[]', [''])[i],
-                    'policy_number': form.get('policy_number[]', [''])[i],
-                    'premium': form.get('premium[]', [''])[i]
+                    'debit_note': debit,
+                    'policy_number': policy,
+                    'premium': premium
                 })
 
             insert_account_statement(main_data, entries)
@@ -210,26 +241,29 @@ def create_doc(doc_type):
         # -------- RENEWAL NOTICE --------
         elif doc_type == 'renewal_notice':
             main_data = {
-                'issue_date': first(form, 'issue_date', ''),
-                'insured': first(form, 'insured', ''),
-                'insurance_class': first(form, 'insurance_class', ''),
-                'policy_number': first(form, 'policy_number', ''),
-                'expiry_date': first(form, 'expiry_date', ''),
-                'ac_code': first(form, 'ac_code', ''),
-                'total_earning': first(form, 'total_earning', '0'),
-                'renewal_premium': first(form, 'renewal_premium', '0'),
+                'issue_date': request.form.get('issue_date', ''),
+                'insured': request.form.get('insured', ''),
+                'insurance_class': request.form.get('insurance_class', ''),
+                'policy_number': request.form.get('policy_number', ''),
+                'expiry_date': request.form.get('expiry_date', ''),
+                'ac_code': request.form.get('ac_code', ''),
+                'total_earning': request.form.get('total_earning', '0'),
+                'renewal_premium': request.form.get('renewal_premium', '0'),
                 'uploaded_by': uploaded_by,
                 'file_name': file_name,
                 'file_data': file_data
             }
 
             entries = []
-            for i, label in enumerate(form.get('label[]', [])):
+            for label, amount in zip(
+                request.form.getlist('label[]'),
+                request.form.getlist('amount[]')
+            ):
                 if not label.strip():
                     continue
                 entries.append({
                     'label': label,
-                    'amount': form.get('amount[]', [''])[i]
+                    'amount': amount
                 })
 
             insert_renewal_notice(main_data, entries)
@@ -284,106 +318,116 @@ def edit_doc(doc_type, doc_id):
             main_data.setdefault('entries', [])
 
         # Also ensure all expected keys exist
-        defaults = {
-            "issue_date": "", "insured_or_agent": "", "insured": "", "insurance_class": "",
-            "policy_number": "", "endorsement_number": "", "account_number": "",
-            "expiry_date": "", "ac_code": "", "total_earning": 0, "renewal_premium": 0,
-            "uploaded_by": "", "file_name": "", "file_data": None
-        }
-        for k, v in defaults.items():
+        for k, v in _DOC_DEFAULTS.items():
             main_data.setdefault(k, v)
 
         return render_template('create.html', doc_type=doc_type, main_data=main_data)
 
     # POST → update
-    form = request.form.to_dict(flat=False)
     file = request.files.get('document_file')
 
-    file_name = main_data.get('file_name')
-    file_data = main_data.get('file_data')
-
     if file and file.filename:
         if not allowed_file(file.filename):
             return "Invalid file type", 400
         file_name = file.filename
-        file_data = file.read()
+        file_data = read_upload(file)
+    else:
+        # keep the stored file; fetched here because the metadata
+        # fetch no longer drags the BLOB along
+        from db import fetch_file
+        file_name, file_data = fetch_file(doc_type, doc_id)
 
-    uploaded_by = first(form, 'uploaded_by', '')
+    uploaded_by = request.form.get('uploaded_by', '')
 
     try:
         if doc_type == 'debit_note':
             main_data_update = {
                 'id': doc_id,
-                'issue_date': first(form, 'issue_date', ''),
-                'insured_or_agent': first(form, 'insured_or_agent', ''),
-                'insurance_class': first(form, 'insurance_class', ''),
-                'policy_number': first(form, 'policy_number', ''),
-                'endorsement_number': first(form, 'endorsement_number', ''),
-                'account_number': first(form, 'account_number', ''),
+                'issue_date': request.form.get('issue_date', ''),
+                'insured_or_agent': request.form.get('insured_or_agent', ''),
+                'insurance_class': request.form.get('insurance_class', ''),
+                'policy_number': request.form.get('policy_number', ''),
+                'endorsement_number': request.form.get('endorsement_number', ''),
+                'account_number': request.form.get('account_number', ''),
                 'uploaded_by': uploaded_by,
                 'file_name': file_name,
                 'file_data': file_data
             }
             financials = []
-            for i, category in enumerate(form.get('category[]', [])):
+            for category, gross, comm, ovr, cost, profit in zip(
+                request.form.getlist('category[]'),
+                request.form.getlist('gross_premium[]'),
+                request.form.getlist('commission[]'),
+                request.form.getlist('overriding_insurer[]'),
+                request.form.getlist('cost[]'),
+                request.form.getlist('profit[]')
+            ):
                 if not category.strip():
                     continue
                 financials.append({
                     'category': category,
-                    'gross_premium': form.get('gross_premium[]', [''])[i],
-                    'commission': form.get('commission[]', [''])[i],
-                    'overriding_insurer': form.get('overriding_insurer[]', [''])[i],
-                    'cost': form.get('cost[]', [''])[i],
-                    'profit': form.get('profit[]', [''])[i]
+                    'gross_premium': gross,
+                    'commission': comm,
+                    'overriding_insurer': ovr,
+                    'cost': cost,
+                    'profit': profit
                 })
             update_debit_note(main_data_update, financials)
 
         elif doc_type == 'account_statement':
             main_data_update = {
                 'id': doc_id,
-                'issue_date': first(form, 'issue_date', ''),
-                'address': first(form, 'address', ''),
-                'account_number': first(form, 'account_number', ''),
-                'total_premium_due': first(form, 'total_premium_due', ''),
-                'premium_due_date': first(form, 'premium_due_date', ''),
+                'issue_date': request.form.get('issue_date', ''),
+                'address': request.form.get('address', ''),
+                'account_number': request.form.get('account_number', ''),
+                'total_premium_due': request.form.get('total_premium_due', ''),
+                'premium_due_date': request.form.get('premium_due_date', ''),
                 'uploaded_by': uploaded_by,
                 'file_name': file_name,
                 'file_data': file_data
             }
             entries = []
-            for i, eff in enumerate(form.get('effective_date[]', [])):
+            for eff, debit, policy, premium in zip(
+                request.form.getlist('effective_date[]'),
+                request.form.getlist('debit_note[]'),
+                request.form.getlist('policy_number[]'),
+                request.form.getlist('premium[]')
+            ):
                 if not eff.strip():
                     continue
                 entries.append({
                     'effective_date': eff,
-                    'debit_note': form.get('debit_note[]', [''])[i],
-                    'policy_number': form.get('policy_number[]', [''])[i],
-                    'premium': form.get('premium[]', [''])[i]
+                    'debit_note': debit,
+                    'policy_number': policy,
+                    'premium': premium
                 })
             update_account_statement(main_data_update, entries)
 
         elif doc_type == 'renewal_notice':
             main_data_update = {
                 'id': doc_id,
-                'issue_date': first(form, 'issue_date', ''),
-                'insured': first(form, 'insured', ''),
-                'insurance_class': first(form, 'insurance_class', ''),
-                'policy_number': first(form, 'policy_number', ''),
-                'expiry_date': first(form, 'expiry_date', ''),
-                'ac_code': first(form, 'ac_code', ''),
-                'total_earning': first(form, 'total_earning', '0'),
-                'renewal_premium': first(form, 'renewal_premium', '0'),
+                'issue_date': request.form.get('issue_date', ''),
+                'insured': request.form.get('insured', ''),
+                'insurance_class': request.form.get('insurance_class', ''),
+                'policy_number': request.form.get('policy_number', ''),
+                'expiry_date': request.form.get('expiry_date', ''),
+                'ac_code': request.form.get('ac_code', ''),
+                'total_earning': request.form.get('total_earning', '0'),
+                'renewal_premium': request.form.get('renewal_premium', '0'),
                 'uploaded_by': uploaded_by,
                 'file_name': file_name,
                 'file_data': file_data
             }
             entries = []
-            for i, label in enumerate(form.get('label[]', [])):
+            for label, amount in zip(
+                request.form.getlist('label[]'),
+                request.form.getlist('amount[]')
+            ):
                 if not label.strip():
                     continue
                 entries.append({
                     'label': label,
-                    'amount': form.get('amount[]', [''])[i]
+                    'amount': amount
                 })
             update_renewal_notice(main_data_update, entries)
 
@@ -397,12 +441,19 @@ def edit_doc(doc_type, doc_id):
 
 
 # ---------------- SCAN PDF ----------------
-from ocr.document_parser import parse_document
-from ocr.ocr_utils import ocr_pdf_to_text
-reader = None
+# Parsed scan results keyed by (pdf content hash, doc_type) so re-scanning
+# the same file (common in the edit flow) skips the OCR pipeline entirely.
+OCR_CACHE = OrderedDict()
+OCR_CACHE_SIZE = 64
+
 
 @app.route('/scan_pdf', methods=['POST'])
 def scan_pdf():
+    # Heavy imports (fitz, numpy, easyocr -> torch) stay out of app startup;
+    # only the first scan pays for them.
+    from ocr.document_parser import parse_document
+    from ocr.ocr_utils import ocr_pdf_to_text
+
     file = request.files.get('document_file')
     existing_file_url = request.form.get('existing_file_url')
     doc_type = request.form.get('doc_type', '')
@@ -410,15 +461,45 @@ def scan_pdf():
     if file:
         pdf_bytes = file.read()
     elif existing_file_url:
-        # Fetch the existing PDF from your preview route
-        from urllib.request import urlopen
-        pdf_bytes = urlopen(existing_file_url).read()
+        # The URL points back at our own /preview/<doc_type>/<doc_id> route;
+        # read the bytes from the DB directly instead of looping an HTTP
+        # request through our own server.
+        from urllib.parse import urlparse
+        from db import open_file_blob
+
+        parts = urlparse(existing_file_url).path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'preview':
+            return jsonify({"error": "Invalid file URL"}), 400
+
+        try:
+            blob, _ = open_file_blob(parts[1], int(parts[2]))
+        except (KeyError, ValueError):
+            return jsonify({"error": "Invalid file URL"}), 400
+
+        if blob is None:
+            return jsonify({"error": "File not found"}), 404
+        try:
+            pdf_bytes = blob.read()
+        finally:
+            blob.close()
     else:
         return jsonify({"error": "Please upload a PDF file"}), 400
 
+    cache_key = (
+        hashlib.blake2b(pdf_bytes, digest_size=16).digest(),
+        doc_type
+    )
+    cached = OCR_CACHE.get(cache_key)
+    if cached is not None:
+        OCR_CACHE.move_to_end(cache_key)
+        return jsonify(cached)
+
     try:
         raw_text = ocr_pdf_to_text(pdf_bytes)
         data = parse_document(raw_text, doc_type)
+        OCR_CACHE[cache_key] = data
+        if len(OCR_CACHE) > OCR_CACHE_SIZE:
+            OCR_CACHE.popitem(last=False)
         return jsonify(data)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -426,35 +507,55 @@ def scan_pdf():
 
 @app.route('/preview/<doc_type>/<int:doc_id>')
 def preview_pdf(doc_type, doc_id):
-    from flask import send_file
-    from io import BytesIO
-    from db import fetch_debit_note_by_id, fetch_account_statement_by_id, fetch_renewal_notice_by_id
+    from db import open_file_blob
 
-    if doc_type == 'debit_note':
-        doc = fetch_debit_note_by_id(doc_id)
-    elif doc_type == 'account_statement':
-        doc = fetch_account_statement_by_id(doc_id)
-    elif doc_type == 'renewal_notice':
-        doc = fetch_renewal_notice_by_id(doc_id)
-    else:
+    if doc_type not in ('debit_note', 'account_statement', 'renewal_notice'):
         return "Unknown doc type", 400
 
-    if not doc or not doc.get('file_data'):
+    blob, file_name = open_file_blob(doc_type, doc_id)
+    if blob is None:
         return "File not found", 404
 
-    return send_file(
-        BytesIO(doc['file_data']),
-        download_name=doc['file_name'],
+    etag = file_etag(doc_type, doc_id, len(blob))
+    if request.headers.get('If-None-Match') == etag:
+        blob.close()
+        return '', 304
+
+    resp = send_file(
+        blob,
+        download_name=file_name,
         mimetype='application/pdf',
         as_attachment=False  # open in browser
     )
+    resp.headers['ETag'] = etag
+    resp.headers['Cache-Control'] = 'private, max-age=3600'
+    resp.call_on_close(blob.close)
+    return resp
 
 
 def open_browser():
     webbrowser.open("http://127.0.0.1:5000/")
 
+
+def warm_ocr_reader():
+    # Load the EasyOCR model in the background so the first
+    # /scan_pdf request doesn't pay the multi-second model load.
+    try:
+        from ocr.ocr_utils import get_reader
+        get_reader()
+    except Exception:
+        pass  # OCR stays lazy; first scan will report the real error
+
+
 if __name__ == '__main__':
     # Open the browser after a short delay so Flask is ready
     threading.Timer(1, open_browser).start()
-    app.run(debug=False)
+    threading.Thread(target=warm_ocr_reader, daemon=True).start()
+    try:
+        # Production WSGI server: a multi-second /scan_pdf no longer
+        # blocks every other request the way the dev server did.
+        from waitress import serve
+        serve(app, host='127.0.0.1', port=5000, threads=8)
+    except ImportError:
+        app.run(debug=False, threaded=True)
     
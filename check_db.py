@@ -23,4 +23,19 @@ else:
     for t in tables:
         print(" -", t[0])
 
+cur.execute("""
+    SELECT name FROM sqlite_master
+    WHERE type='index' AND name NOT LIKE 'sqlite_%'
+    ORDER BY name
+""")
+
+indexes = cur.fetchall()
+
+if not indexes:
+    print("❌ No indexes found")
+else:
+    print("✅ Indexes:")
+    for i in indexes:
+        print(" -", i[0])
+
 conn.close()
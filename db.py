@@ -1,5 +1,15 @@
+import atexit
+import functools
+import heapq
+import queue
 import sqlite3
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
 
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS debit_notes (
@@ -12,8 +22,7 @@ CREATE TABLE IF NOT EXISTS debit_notes (
     account_number TEXT,
     created_at TEXT,
     uploaded_by TEXT,
-    file_name TEXT,
-    file_data BLOB
+    file_name TEXT
 );
 
 CREATE TABLE IF NOT EXISTS debit_note_financials (
@@ -39,8 +48,7 @@ CREATE TABLE IF NOT EXISTS account_statements (
     premium_due_date TEXT,
     created_at TEXT,
     uploaded_by TEXT,
-    file_name TEXT,
-    file_data BLOB
+    file_name TEXT
 );
 
 CREATE TABLE IF NOT EXISTS account_statement_entries (
@@ -67,8 +75,7 @@ CREATE TABLE IF NOT EXISTS renewal_notices (
     renewal_premium REAL,
     created_at TEXT,
     uploaded_by TEXT,
-    file_name TEXT,
-    file_data BLOB
+    file_name TEXT
 );
 
 CREATE TABLE IF NOT EXISTS renewal_notice_entries (
@@ -81,9 +88,82 @@ CREATE TABLE IF NOT EXISTS renewal_notice_entries (
         ON DELETE CASCADE
 );
 """
-import os
-import sys
-import sqlite3
+
+# Uploaded PDFs live in one-row-per-document side tables so parent-table
+# scans never walk blob overflow pages. Kept out of SCHEMA_SQL because
+# this script also upgrades databases created before the split.
+FILES_SQL = """
+CREATE TABLE IF NOT EXISTS debit_note_files (
+    debit_note_id INTEGER PRIMARY KEY,
+    file_data BLOB,
+    FOREIGN KEY (debit_note_id)
+        REFERENCES debit_notes(id)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS account_statement_files (
+    account_statement_id INTEGER PRIMARY KEY,
+    file_data BLOB,
+    FOREIGN KEY (account_statement_id)
+        REFERENCES account_statements(id)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS renewal_notice_files (
+    renewal_notice_id INTEGER PRIMARY KEY,
+    file_data BLOB,
+    FOREIGN KEY (renewal_notice_id)
+        REFERENCES renewal_notices(id)
+        ON DELETE CASCADE
+);
+"""
+
+# Substring search (LIKE '%x%') cannot use the B-tree indexes; a trigram
+# FTS5 mirror of the searched debit-note columns answers those filters
+# from its token index instead of scanning the table. External-content
+# table: the triggers keep it in sync, text is stored only once.
+FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS debit_notes_fts USING fts5(
+    policy_number, account_number, insured_or_agent,
+    content='debit_notes', content_rowid='id',
+    tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS debit_notes_fts_ai AFTER INSERT ON debit_notes BEGIN
+    INSERT INTO debit_notes_fts(rowid, policy_number, account_number, insured_or_agent)
+    VALUES (new.id, new.policy_number, new.account_number, new.insured_or_agent);
+END;
+
+CREATE TRIGGER IF NOT EXISTS debit_notes_fts_ad AFTER DELETE ON debit_notes BEGIN
+    INSERT INTO debit_notes_fts(debit_notes_fts, rowid, policy_number, account_number, insured_or_agent)
+    VALUES ('delete', old.id, old.policy_number, old.account_number, old.insured_or_agent);
+END;
+
+CREATE TRIGGER IF NOT EXISTS debit_notes_fts_au AFTER UPDATE ON debit_notes BEGIN
+    INSERT INTO debit_notes_fts(debit_notes_fts, rowid, policy_number, account_number, insured_or_agent)
+    VALUES ('delete', old.id, old.policy_number, old.account_number, old.insured_or_agent);
+    INSERT INTO debit_notes_fts(rowid, policy_number, account_number, insured_or_agent)
+    VALUES (new.id, new.policy_number, new.account_number, new.insured_or_agent);
+END;
+"""
+
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_dn_issue_date ON debit_notes(issue_date);
+CREATE INDEX IF NOT EXISTS idx_dn_policy ON debit_notes(policy_number);
+CREATE INDEX IF NOT EXISTS idx_dn_account ON debit_notes(account_number);
+CREATE INDEX IF NOT EXISTS idx_as_issue_date ON account_statements(issue_date);
+CREATE INDEX IF NOT EXISTS idx_as_account ON account_statements(account_number);
+CREATE INDEX IF NOT EXISTS idx_rn_issue_date ON renewal_notices(issue_date);
+CREATE INDEX IF NOT EXISTS idx_rn_policy ON renewal_notices(policy_number);
+
+CREATE INDEX IF NOT EXISTS idx_dn_issue_sort ON debit_notes((issue_date IS NULL), issue_date, id);
+CREATE INDEX IF NOT EXISTS idx_as_issue_sort ON account_statements((issue_date IS NULL), issue_date, id);
+CREATE INDEX IF NOT EXISTS idx_rn_issue_sort ON renewal_notices((issue_date IS NULL), issue_date, id);
+
+CREATE INDEX IF NOT EXISTS idx_dnf_note ON debit_note_financials(debit_note_id, id);
+CREATE INDEX IF NOT EXISTS idx_ase_stmt ON account_statement_entries(account_statement_id, id);
+CREATE INDEX IF NOT EXISTS idx_rne_notice ON renewal_notice_entries(renewal_notice_id, id);
+"""
 
 # ---------------- PERSISTENT DB PATH ----------------
 if getattr(sys, 'frozen', False):
@@ -96,159 +176,642 @@ else:
 DB_FILE = os.path.join(base_path, "insurance.db")
 
 
-# ---------------- CONNECTION ----------------
-def get_conn():
-    first_time = not os.path.exists(DB_FILE)
+# ---------------- CONNECTION POOLS ----------------
+# Under WAL any number of readers can run beside the single writer, but
+# one shared connection would serialize them on its mutex — so fetches
+# borrow from a pool of read-only connections while all writes share
+# one writer (SQLite serializes writers anyway).
+READ_POOL_SIZE = min(2 * (os.cpu_count() or 4), 16)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# False when the bundled SQLite lacks FTS5; filters then stay on LIKE.
+_fts_ready = False
+
+
+@dataclass
+class _PoolEntry:
+    conn: sqlite3.Connection
+    last_used: float = 0.0
+
+
+class _Pool:
+    """Bounded lazy pool; blocks on acquire once size connections exist."""
+
+    def __init__(self, size, factory):
+        self._size = size
+        self._factory = factory
+        self._queue = queue.Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def acquire(self):
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self._size:
+                self._created += 1
+                return _PoolEntry(self._factory())
+
+        return self._queue.get()
+
+    def release(self, entry):
+        entry.last_used = time.monotonic()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            entry.conn.close()
+
+    def drain(self):
+        while True:
+            try:
+                self._queue.get_nowait().conn.close()
+            except queue.Empty:
+                break
 
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
 
+def _new_conn():
+    """Open and configure one physical connection (pool factory)."""
+    global _schema_ready, _fts_ready
+
+    first_time = not os.path.exists(DB_FILE)
+
+    # 256 cached prepared statements comfortably covers every distinct
+    # query in this module, so repeat calls skip the SQL parse/plan step.
+    # Autocommit mode: transactions are opened explicitly via tx(), never
+    # implicitly by the driver, so reads stay lock-free.
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False,
+                           cached_statements=256, isolation_level=None)
     if first_time:
-        conn.executescript(SCHEMA_SQL)
-        conn.commit()
+        # Both pragmas must precede the first write to a brand-new file —
+        # the journal_mode pragma below already initializes page 1, and
+        # page geometry / auto_vacuum are frozen from then on. 8 KiB
+        # pages halve the overflow-chain hops for the stored PDFs;
+        # INCREMENTAL auto_vacuum keeps the pointer-map pages that let
+        # reads skip those chains.
+        conn.execute("PRAGMA page_size = 8192")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # Applied exactly once per physical connection. WAL lets the index
+    # page keep reading while a save is in flight; NORMAL sync, in-memory
+    # temp store, a 64 MB page cache and a 256 MB mmap window cut per-query
+    # I/O on the many small fetches.
+    conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        PRAGMA synchronous = NORMAL;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA mmap_size = 268435456;
+        PRAGMA cache_size = -65536;
+        PRAGMA foreign_keys = ON;
+    """)
+
+    with _schema_lock:
+        if first_time:
+            conn.executescript(SCHEMA_SQL)
+
+        if not _schema_ready:
+            # Also upgrades databases created before the indexes or the
+            # blob side tables existed.
+            conn.executescript(FILES_SQL)
+            _migrate_file_blobs(conn)
+            conn.executescript(INDEX_SQL)
+            try:
+                fts_missing = not conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'debit_notes_fts'"
+                ).fetchone()
+                conn.executescript(FTS_SQL)
+                if fts_missing:
+                    # Backfill rows inserted before the index existed.
+                    conn.execute("INSERT INTO debit_notes_fts(debit_notes_fts)"
+                                 " VALUES ('rebuild')")
+                _fts_ready = True
+            except sqlite3.OperationalError:
+                pass
+            # Refresh planner statistics once per process so the new
+            # indexes actually get picked.
+            conn.execute("ANALYZE")
+            _schema_ready = True
 
     return conn
 
+
+def _new_read_conn():
+    """Open one read-only connection (read-pool factory)."""
+    # The writer creates/upgrades the schema; a mode=ro open on a
+    # missing or stale database would fail.
+    _ensure_schema()
+
+    conn = sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True,
+                           check_same_thread=False,
+                           cached_statements=256, isolation_level=None)
+    # Per-connection cache/IO pragmas only; journal mode and schema are
+    # the writer's business.
+    conn.executescript("""
+        PRAGMA temp_store = MEMORY;
+        PRAGMA mmap_size = 268435456;
+        PRAGMA cache_size = -65536;
+    """)
+    return conn
+
+
+_write_pool = _Pool(1, _new_conn)
+_read_pool = _Pool(READ_POOL_SIZE, _new_read_conn)
+
+
+def _ensure_schema():
+    """Run the writer's create/upgrade path before the first ro connect."""
+    if not _schema_ready:
+        with borrow_write():
+            pass
+
+
+@contextmanager
+def _borrow_from(pool):
+    """
+    Borrow a long-lived connection from a pool.
+
+    Connections keep their page cache warm across requests; open/close
+    syscalls happen only when the pool grows. Rolls back and re-raises
+    on error so a failed write never leaks a dirty transaction back
+    into the pool.
+    """
+    entry = pool.acquire()
+    try:
+        yield entry.conn
+    except Exception:
+        entry.conn.rollback()
+        raise
+    finally:
+        pool.release(entry)
+
+
+def borrow_read():
+    """Borrow a read-only connection; fetches never queue behind a write."""
+    return _borrow_from(_read_pool)
+
+
+def borrow_write():
+    """Borrow the single writer connection."""
+    return _borrow_from(_write_pool)
+
+
+@contextmanager
+def tx(conn):
+    """
+    Run the enclosed statements as one IMMEDIATE transaction.
+
+    Takes the write lock up front and commits (one fsync) exactly once,
+    however many parent/child statements the block issues.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _drain_pools():
+    _read_pool.drain()
+    _write_pool.drain()
+
+
+atexit.register(_drain_pools)
+
+# doc_type -> (parent table, blob side table, FK column in the side table)
+_FILE_TABLES = {
+    'debit_note':
+        ('debit_notes', 'debit_note_files', 'debit_note_id'),
+    'account_statement':
+        ('account_statements', 'account_statement_files', 'account_statement_id'),
+    'renewal_notice':
+        ('renewal_notices', 'renewal_notice_files', 'renewal_notice_id'),
+}
+
+
+def _migrate_file_blobs(conn):
+    """One-time upgrade: move inline file_data blobs into the side tables."""
+    for table, files_table, fk in _FILE_TABLES.values():
+        cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if 'file_data' not in cols:
+            continue
+        conn.executescript(f"""
+            INSERT INTO {files_table} ({fk}, file_data)
+                SELECT id, file_data FROM {table} WHERE file_data IS NOT NULL;
+            ALTER TABLE {table} DROP COLUMN file_data;
+        """)
+
+# ---------------- FILTERS ----------------
+_ALLOWED_OPS = frozenset({'=', '!=', '<', '<=', '>', '>=', 'LIKE'})
+
+# Filterable columns per table; anything else in a filter is ignored.
+_DN_FIELDS = frozenset({'id', 'issue_date', 'insured_or_agent', 'insurance_class',
+                        'policy_number', 'endorsement_number', 'account_number',
+                        'uploaded_by'})
+_DNF_FIELDS = frozenset({'category', 'gross_premium', 'commission',
+                         'overriding_insurer', 'cost', 'profit'})
+_AS_FIELDS = frozenset({'id', 'issue_date', 'address', 'account_number',
+                        'total_premium_due', 'premium_due_date', 'uploaded_by'})
+_ASE_FIELDS = frozenset({'effective_date', 'debit_note', 'policy_number',
+                         'premium'})
+_RN_FIELDS = frozenset({'id', 'issue_date', 'insured', 'insurance_class',
+                        'policy_number', 'expiry_date', 'ac_code',
+                        'total_earning', 'renewal_premium', 'uploaded_by'})
+_RNE_FIELDS = frozenset({'label', 'amount'})
+
+# Debit-note columns mirrored into the FTS index.
+_DN_FTS_FIELDS = frozenset({'policy_number', 'account_number', 'insured_or_agent'})
+
+
+def _split_fts_filters(filters):
+    """
+    Pull substring filters answerable by the FTS index out of filters.
+
+    Returns (match_expr, remaining). Trigram tokens need at least three
+    characters, so shorter values stay on the plain LIKE path.
+    """
+    terms = []
+    rest = []
+    for f in filters:
+        value = str(f.get('value') or '')
+        if (f['op'].upper() == 'LIKE' and f['field'] in _DN_FTS_FIELDS
+                and len(value) >= 3):
+            quoted = value.replace('"', '""')
+            terms.append(f'{f["field"]} : "{quoted}"')
+        else:
+            rest.append(f)
+    return " AND ".join(terms), rest
+
+
+# Listing columns a caller may sort on (the filter fields plus file_name).
+_DN_SORTABLE = _DN_FIELDS | {'file_name'}
+_AS_SORTABLE = _AS_FIELDS | {'file_name'}
+_RN_SORTABLE = _RN_FIELDS | {'file_name'}
+
+
+def _normalize_filters(filters, fields):
+    """
+    Reduce a filter list to sorted (field, OP, value) triples, dropping
+    anything whose field or operator is not whitelisted. Sorting means
+    equivalent filter sets produce the same SQL string, so both our
+    clause cache and sqlite3's statement cache can hit; the operator
+    whitelist closes the injection hole of interpolating f['op'] raw.
+    """
+    norm = [
+        (f['field'], f['op'].upper(), f['value'])
+        for f in filters
+        if f['field'] in fields and f['op'].upper() in _ALLOWED_OPS
+    ]
+    norm.sort(key=lambda t: (t[0], t[1]))
+    return norm
+
+
+@functools.lru_cache(maxsize=256)
+def _filter_clause(key):
+    """Build ' AND field OP ?' for each (field, op) pair in key."""
+    return "".join(f" AND {field} {op} ?" for field, op in key)
+
+
+def _apply_filters(query, params, filters, fields):
+    """Append the cached WHERE fragment for filters and fill params."""
+    norm = _normalize_filters(filters, fields)
+    query += _filter_clause(tuple((f, op) for f, op, _ in norm))
+    for _, op, value in norm:
+        params.append(f"%{value}%" if op == 'LIKE' else value)
+    return query
+
+
+def _limit_clause(query, params, limit, offset):
+    """Append a bound LIMIT/OFFSET so callers fetch only the page they show."""
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend((limit, offset))
+    return query
+
+
+def _order_clause(sort_by, sort_order, fields):
+    """
+    Whitelisted ORDER BY fragment matching the old Python sort key
+    (v is None, v, id): NULLs sort after values ascending, before them
+    descending, with id as the tie-breaker.
+    """
+    if sort_by not in fields:
+        return ""
+    direction = "DESC" if sort_order == 'desc' else "ASC"
+    return (f" ORDER BY ({sort_by} IS NULL) {direction},"
+            f" {sort_by} {direction}, id {direction}")
+
+
+# Statements shared between insert_* and update_* live at module level so
+# every call passes the identical string and hits the per-connection
+# prepared-statement cache instead of re-parsing the SQL.
+INSERT_DEBIT_NOTE_SQL = """
+    INSERT INTO debit_notes (
+        issue_date, insured_or_agent, insurance_class,
+        policy_number, endorsement_number, account_number,
+        created_at, uploaded_by, file_name
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_DEBIT_FILE_SQL = """
+    INSERT INTO debit_note_files (debit_note_id, file_data)
+    VALUES (?, ?)
+    ON CONFLICT(debit_note_id) DO UPDATE SET file_data = excluded.file_data
+"""
+
+INSERT_FIN_SQL = """
+    INSERT INTO debit_note_financials (
+        debit_note_id, category, gross_premium,
+        commission, overriding_insurer, cost, profit
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_ACCOUNT_STATEMENT_SQL = """
+    INSERT INTO account_statements (
+        issue_date, address, account_number,
+        total_premium_due, premium_due_date,
+        created_at, uploaded_by, file_name
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_STATEMENT_FILE_SQL = """
+    INSERT INTO account_statement_files (account_statement_id, file_data)
+    VALUES (?, ?)
+    ON CONFLICT(account_statement_id) DO UPDATE SET file_data = excluded.file_data
+"""
+
+INSERT_STATEMENT_ENTRY_SQL = """
+    INSERT INTO account_statement_entries (
+        account_statement_id, effective_date,
+        debit_note, policy_number, premium
+    ) VALUES (?, ?, ?, ?, ?)
+"""
+
+INSERT_RENEWAL_NOTICE_SQL = """
+    INSERT INTO renewal_notices (
+        issue_date, insured, insurance_class,
+        policy_number, expiry_date, ac_code,
+        total_earning, renewal_premium,
+        created_at, uploaded_by, file_name
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_RENEWAL_FILE_SQL = """
+    INSERT INTO renewal_notice_files (renewal_notice_id, file_data)
+    VALUES (?, ?)
+    ON CONFLICT(renewal_notice_id) DO UPDATE SET file_data = excluded.file_data
+"""
+
+INSERT_RENEWAL_ENTRY_SQL = """
+    INSERT INTO renewal_notice_entries (renewal_notice_id, label, amount)
+    VALUES (?, ?, ?)
+"""
+
+
+class _BorrowedBlob:
+    """File-like blob wrapper that returns its pooled connection on close."""
+
+    def __init__(self, entry, blob):
+        self._entry = entry
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._blob)
+
+    def read(self, length=-1):
+        return self._blob.read(length)
+
+    def seek(self, offset, origin=0):
+        self._blob.seek(offset, origin)
+
+    def tell(self):
+        return self._blob.tell()
+
+    def close(self):
+        if self._entry is None:
+            return
+        self._blob.close()
+        _read_pool.release(self._entry)
+        self._entry = None
+
+
+def open_file_blob(doc_type, doc_id):
+    """
+    Open the stored file for streaming via SQLite's incremental BLOB I/O.
+
+    Returns (blob, file_name); blob reads straight from the DB page
+    cache so the file is never materialized as one Python bytes object.
+    Returns (None, None) when the row or file is missing. Closing the
+    blob returns its borrowed connection to the pool, so callers must
+    close it once the response has been sent.
+    """
+    table, files_table, fk = _FILE_TABLES[doc_type]
+    entry = _read_pool.acquire()
+    try:
+        cur = entry.conn.execute(
+            f"SELECT p.file_name, length(f.file_data)"
+            f" FROM {table} p LEFT JOIN {files_table} f ON f.{fk} = p.id"
+            f" WHERE p.id = ?",
+            (doc_id,)
+        )
+        row = cur.fetchone()
+        if not row or not row[1]:
+            _read_pool.release(entry)
+            return None, None
+
+        # The FK column is the side table's INTEGER PRIMARY KEY, so its
+        # rowid equals the parent id.
+        blob = entry.conn.blobopen(files_table, 'file_data', doc_id,
+                                   readonly=True)
+    except Exception:
+        _read_pool.release(entry)
+        raise
+
+    return _BorrowedBlob(entry, blob), row[0]
+
+
+def fetch_file(doc_type, doc_id):
+    """Fetch (file_name, file_data) for one document, or (None, None)."""
+    table, files_table, fk = _FILE_TABLES[doc_type]
+    with borrow_read() as conn:
+        cur = conn.execute(
+            f"SELECT p.file_name, f.file_data"
+            f" FROM {table} p LEFT JOIN {files_table} f ON f.{fk} = p.id"
+            f" WHERE p.id = ?",
+            (doc_id,)
+        )
+        row = cur.fetchone()
+    if not row:
+        return None, None
+    return row[0], row[1]
+
+
+
+def _utc_now():
+    """UTC timestamp in the same 'YYYY-MM-DD HH:MM:SS' shape datetime('now') produced."""
+    return datetime.utcnow().isoformat(sep=' ', timespec='seconds')
+
+
+def _rows_to_dicts(cur):
+    """Materialize a cursor as plain dicts straight from result tuples."""
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _as_real(v):
+    """
+    Mirror SQLite's REAL-affinity coercion: forms resubmit numbers as
+    strings ('100.50') while the stored column comes back as a float,
+    so both sides must be normalized before an unchanged-row check can
+    ever match. Values SQLite would keep as text stay untouched.
+    """
+    if isinstance(v, str):
+        try:
+            return float(v)
+        except ValueError:
+            return v
+    return v
+
+
 # ---------------- DEBIT NOTES ----------------
 def insert_debit_note(data, financials=None):
     if financials is None:
         financials = []
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO debit_notes (
-            issue_date, insured_or_agent, insurance_class,
-            policy_number, endorsement_number, account_number,
-            created_at, uploaded_by, file_name, file_data
-        ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, ?)
-    """, (
-        data['issue_date'],
-        data.get('insured_or_agent'),
-        data.get('insurance_class'),
-        data.get('policy_number'),
-        data.get('endorsement_number'),
-        data.get('account_number'),
-        data.get('uploaded_by', 'admin'),
-        data.get('file_name'),
-        data.get('file_data')
-    ))
-
-    note_id = cur.lastrowid
-
-    for f in financials:
-        cur.execute("""
-            INSERT INTO debit_note_financials (
-                debit_note_id, category, gross_premium,
-                commission, overriding_insurer, cost, profit
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            note_id,
-            f['category'],
-            f['gross_premium'],
-            f['commission'],
-            f['overriding_insurer'],
-            f['cost'],
-            f['profit']
+    with borrow_write() as conn, tx(conn):
+        cur = conn.cursor()
+
+        cur.execute(INSERT_DEBIT_NOTE_SQL, (
+            data['issue_date'],
+            data.get('insured_or_agent'),
+            data.get('insurance_class'),
+            data.get('policy_number'),
+            data.get('endorsement_number'),
+            data.get('account_number'),
+            _utc_now(),
+            data.get('uploaded_by', 'admin'),
+            data.get('file_name')
         ))
 
-    conn.commit()
-    conn.close()
+        note_id = cur.lastrowid
+
+        if data.get('file_data') is not None:
+            cur.execute(UPSERT_DEBIT_FILE_SQL, (note_id, data['file_data']))
+
+        cur.executemany(INSERT_FIN_SQL, [
+            (note_id, f['category'], f['gross_premium'], f['commission'],
+             f['overriding_insurer'], f['cost'], f['profit'])
+            for f in financials
+        ])
+
     return note_id
 
 
-def fetch_debit_notes(filters=None):
+def fetch_debit_notes(filters=None, sort_by=None, sort_order='asc',
+                      limit=None, offset=0):
     """Fetch debit notes for listing (no file_data)"""
     if filters is None:
         filters = []
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-    query = """
-        SELECT id, issue_date, insured_or_agent, insurance_class,
-               policy_number, endorsement_number, account_number, uploaded_by,
-               file_name
-        FROM debit_notes
-        WHERE 1=1
+        query = """
+            SELECT id, issue_date, insured_or_agent, insurance_class,
+                   policy_number, endorsement_number, account_number, uploaded_by,
+                   file_name
+            FROM debit_notes
+            WHERE 1=1
+        """
+        params = []
+
+        if _fts_ready:
+            match_expr, filters = _split_fts_filters(filters)
+            if match_expr:
+                query += (" AND id IN (SELECT rowid FROM debit_notes_fts"
+                          " WHERE debit_notes_fts MATCH ?)")
+                params.append(match_expr)
+
+        query = _apply_filters(query, params, filters, _DN_FIELDS)
+        query += _order_clause(sort_by, sort_order, _DN_SORTABLE)
+        query = _limit_clause(query, params, limit, offset)
+
+        cur.execute(query, params)
+        return _rows_to_dicts(cur)
+
+
+class _CacheMiss(LookupError):
+    """
+    Raised inside the cached single-document fetchers when the row does
+    not exist. lru_cache never stores a call that raises, so a lookup of
+    a not-yet-inserted id (stale tab, mistyped URL) can't poison the
+    cache into returning None after the document is created.
     """
-    params = []
-    fields = {'id','issue_date','insured_or_agent','insurance_class',
-              'policy_number','endorsement_number','account_number','uploaded_by'}
 
-    for f in filters:
-        if f['field'] in fields:
-            if f['op'].upper() == 'LIKE':
-                query += f" AND {f['field']} LIKE ?"
-                params.append(f"%{f['value']}%")
-            else:
-                query += f" AND {f['field']} {f['op']} ?"
-                params.append(f['value'])
 
-    cur.execute(query, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+@functools.lru_cache(maxsize=32)
+def _fetch_debit_note_cached(note_id):
+    """Fetch a single debit note (metadata + financials, no file_data)"""
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
+        cur.execute("""
+            SELECT id, issue_date, insured_or_agent, insurance_class,
+                   policy_number, endorsement_number, account_number,
+                   created_at, uploaded_by, file_name
+            FROM debit_notes WHERE id = ?
+        """, (note_id,))
+        note = cur.fetchone()
+        if not note:
+            raise _CacheMiss
+        note_cols = [d[0] for d in cur.description]
 
-def fetch_debit_note_by_id(note_id):
-    """Fetch a single debit note (includes file_data + financials)"""
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("SELECT * FROM debit_notes WHERE id = ?", (note_id,))
-    note = cur.fetchone()
-    if not note:
-        conn.close()
-        return None
+        cur.execute("""
+            SELECT id, category, gross_premium, commission,
+                   overriding_insurer, cost, profit
+            FROM debit_note_financials
+            WHERE debit_note_id = ?
+            ORDER BY id
+        """, (note_id,))
+        financials = _rows_to_dicts(cur)
 
-    cur.execute("""
-        SELECT id, category, gross_premium, commission,
-               overriding_insurer, cost, profit
-        FROM debit_note_financials
-        WHERE debit_note_id = ?
-        ORDER BY id
-    """, (note_id,))
-    financials = [dict(r) for r in cur.fetchall()]
+        result = dict(zip(note_cols, note))
+        result["financials"] = financials
+        return result
 
-    conn.close()
 
-    result = dict(note)
-    result["financials"] = financials
-    return result
+def fetch_debit_note_by_id(note_id):
+    try:
+        doc = _fetch_debit_note_cached(note_id)
+    except _CacheMiss:
+        return None
+    # shallow-copy so callers can decorate the dict without
+    # polluting the cache
+    return dict(doc)
 
 
 def fetch_debit_note_financials(note_id, filters=None):
     if filters is None:
         filters = []
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-    query = """
-        SELECT id, category, gross_premium, commission,
-               overriding_insurer, cost, profit
-        FROM debit_note_financials
-        WHERE debit_note_id = ?
-    """
-    params = [note_id]
-    fields = {'category','gross_premium','commission','overriding_insurer','cost','profit'}
-
-    for f in filters:
-        if f['field'] in fields:
-            if f['op'].upper() == 'LIKE':
-                query += f" AND {f['field']} LIKE ?"
-                params.append(f"%{f['value']}%")
-            else:
-                query += f" AND {f['field']} {f['op']} ?"
-                params.append(f['value'])
+        query = """
+            SELECT id, category, gross_premium, commission,
+                   overriding_insurer, cost, profit
+            FROM debit_note_financials
+            WHERE debit_note_id = ?
+        """
+        params = [note_id]
+        query = _apply_filters(query, params, filters, _DNF_FIELDS)
 
-    cur.execute(query, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+        cur.execute(query, params)
+        return _rows_to_dicts(cur)
 
 
 # ---------------- ACCOUNT STATEMENTS ----------------
@@ -256,135 +819,113 @@ def insert_account_statement(data, entries=None):
     if entries is None:
         entries = []
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO account_statements (
-            issue_date, address, account_number,
-            total_premium_due, premium_due_date,
-            created_at, uploaded_by, file_name, file_data
-        ) VALUES (?, ?, ?, ?, ?, datetime('now'), ?, ?, ?)
-    """, (
-        data['issue_date'],
-        data.get('address'),
-        data.get('account_number'),
-        data.get('total_premium_due'),
-        data.get('premium_due_date'),
-        data.get('uploaded_by', 'admin'),
-        data.get('file_name'),
-        data.get('file_data')
-    ))
-
-    stmt_id = cur.lastrowid
-
-    for e in entries:
-        cur.execute("""
-            INSERT INTO account_statement_entries (
-                account_statement_id, effective_date,
-                debit_note, policy_number, premium
-            ) VALUES (?, ?, ?, ?, ?)
-        """, (
-            stmt_id,
-            e['effective_date'],
-            e['debit_note'],
-            e['policy_number'],
-            e['premium']
+    with borrow_write() as conn, tx(conn):
+        cur = conn.cursor()
+
+        cur.execute(INSERT_ACCOUNT_STATEMENT_SQL, (
+            data['issue_date'],
+            data.get('address'),
+            data.get('account_number'),
+            data.get('total_premium_due'),
+            data.get('premium_due_date'),
+            _utc_now(),
+            data.get('uploaded_by', 'admin'),
+            data.get('file_name')
         ))
 
-    conn.commit()
-    conn.close()
+        stmt_id = cur.lastrowid
+
+        if data.get('file_data') is not None:
+            cur.execute(UPSERT_STATEMENT_FILE_SQL, (stmt_id, data['file_data']))
+
+        cur.executemany(INSERT_STATEMENT_ENTRY_SQL, [
+            (stmt_id, e['effective_date'], e['debit_note'],
+             e['policy_number'], e['premium'])
+            for e in entries
+        ])
+
     return stmt_id
 
 
-def fetch_account_statements(filters=None):
+def fetch_account_statements(filters=None, sort_by=None, sort_order='asc',
+                             limit=None, offset=0):
     """Fetch account statements for listing (no file_data)"""
     if filters is None:
         filters = []
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-    query = """
-        SELECT id, issue_date, address, account_number,
-               total_premium_due, premium_due_date, uploaded_by,
-               file_name
-        FROM account_statements
-        WHERE 1=1
-    """
-    params = []
-    fields = {'id','issue_date','address','account_number','total_premium_due','premium_due_date','uploaded_by'}
+        query = """
+            SELECT id, issue_date, address, account_number,
+                   total_premium_due, premium_due_date, uploaded_by,
+                   file_name
+            FROM account_statements
+            WHERE 1=1
+        """
+        params = []
+        query = _apply_filters(query, params, filters, _AS_FIELDS)
+        query += _order_clause(sort_by, sort_order, _AS_SORTABLE)
+        query = _limit_clause(query, params, limit, offset)
 
-    for f in filters:
-        if f['field'] in fields:
-            if f['op'].upper() == 'LIKE':
-                query += f" AND {f['field']} LIKE ?"
-                params.append(f"%{f['value']}%")
-            else:
-                query += f" AND {f['field']} {f['op']} ?"
-                params.append(f['value'])
+        cur.execute(query, params)
+        return _rows_to_dicts(cur)
 
-    cur.execute(query, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
 
+@functools.lru_cache(maxsize=32)
+def _fetch_account_statement_cached(stmt_id):
+    """Fetch a single account statement (metadata + entries, no file_data)"""
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-def fetch_account_statement_by_id(stmt_id):
-    """Fetch a single account statement (includes file_data + entries)"""
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("SELECT * FROM account_statements WHERE id = ?", (stmt_id,))
-    stmt = cur.fetchone()
-    if not stmt:
-        conn.close()
-        return None
+        cur.execute("""
+            SELECT id, issue_date, address, account_number,
+                   total_premium_due, premium_due_date,
+                   created_at, uploaded_by, file_name
+            FROM account_statements WHERE id = ?
+        """, (stmt_id,))
+        stmt = cur.fetchone()
+        if not stmt:
+            raise _CacheMiss
+        stmt_cols = [d[0] for d in cur.description]
 
-    cur.execute("""
-        SELECT id, effective_date, debit_note, policy_number, premium
-        FROM account_statement_entries
-        WHERE account_statement_id = ?
-        ORDER BY id
-    """, (stmt_id,))
-    entries = [dict(r) for r in cur.fetchall()]
+        cur.execute("""
+            SELECT id, effective_date, debit_note, policy_number, premium
+            FROM account_statement_entries
+            WHERE account_statement_id = ?
+            ORDER BY id
+        """, (stmt_id,))
+        entries = _rows_to_dicts(cur)
 
-    conn.close()
+        result = dict(zip(stmt_cols, stmt))
+        result["entries"] = entries
+        return result
 
-    result = dict(stmt)
-    result["entries"] = entries
-    return result
 
+def fetch_account_statement_by_id(stmt_id):
+    try:
+        return dict(_fetch_account_statement_cached(stmt_id))
+    except _CacheMiss:
+        return None
 
 
 def fetch_account_statement_entries(stmt_id, filters=None):
     if filters is None:
         filters = []
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-    query = """
-        SELECT id, effective_date, debit_note, policy_number, premium
-        FROM account_statement_entries
-        WHERE account_statement_id = ?
-    """
-    params = [stmt_id]
-    fields = {'effective_date','debit_note','policy_number','premium'}
+        query = """
+            SELECT id, effective_date, debit_note, policy_number, premium
+            FROM account_statement_entries
+            WHERE account_statement_id = ?
+        """
+        params = [stmt_id]
+        query = _apply_filters(query, params, filters, _ASE_FIELDS)
 
-    for f in filters:
-        if f['field'] in fields:
-            if f['op'].upper() == 'LIKE':
-                query += f" AND {f['field']} LIKE ?"
-                params.append(f"%{f['value']}%")
-            else:
-                query += f" AND {f['field']} {f['op']} ?"
-                params.append(f['value'])
-
-    cur.execute(query, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+        cur.execute(query, params)
+        return _rows_to_dicts(cur)
 
 
 # ---------------- RENEWAL NOTICES ----------------
@@ -392,160 +933,204 @@ def insert_renewal_notice(data, entries=None):
     if entries is None:
         entries = []
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO renewal_notices (
-            issue_date, insured, insurance_class,
-            policy_number, expiry_date, ac_code,
-            total_earning, renewal_premium,
-            created_at, uploaded_by, file_name, file_data
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, ?)
-    """, (
-        data['issue_date'],
-        data.get('insured'),
-        data.get('insurance_class'),
-        data.get('policy_number'),
-        data.get('expiry_date'),
-        data.get('ac_code'),
-        data.get('total_earning', 0),
-        data.get('renewal_premium', 0),
-        data.get('uploaded_by', 'admin'),
-        data.get('file_name'),
-        data.get('file_data')
-    ))
-
-    notice_id = cur.lastrowid
-
-    for e in entries:
-        cur.execute("""
-            INSERT INTO renewal_notice_entries (renewal_notice_id, label, amount)
-            VALUES (?, ?, ?)
-        """, (notice_id, e['label'], e['amount']))
+    with borrow_write() as conn, tx(conn):
+        cur = conn.cursor()
+
+        cur.execute(INSERT_RENEWAL_NOTICE_SQL, (
+            data['issue_date'],
+            data.get('insured'),
+            data.get('insurance_class'),
+            data.get('policy_number'),
+            data.get('expiry_date'),
+            data.get('ac_code'),
+            data.get('total_earning', 0),
+            data.get('renewal_premium', 0),
+            _utc_now(),
+            data.get('uploaded_by', 'admin'),
+            data.get('file_name')
+        ))
+
+        notice_id = cur.lastrowid
+
+        if data.get('file_data') is not None:
+            cur.execute(UPSERT_RENEWAL_FILE_SQL, (notice_id, data['file_data']))
+
+        cur.executemany(INSERT_RENEWAL_ENTRY_SQL, [
+            (notice_id, e['label'], e['amount']) for e in entries
+        ])
 
-    conn.commit()
-    conn.close()
     return notice_id
 
 
-def fetch_renewal_notices(filters=None):
+def fetch_renewal_notices(filters=None, sort_by=None, sort_order='asc',
+                          limit=None, offset=0):
     """Fetch renewal notices for listing (no file_data)"""
     if filters is None:
         filters = []
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-    query = """
-        SELECT id, issue_date, insured, insurance_class,
-               policy_number, expiry_date, ac_code,
-               total_earning, renewal_premium, uploaded_by,
-               file_name
-        FROM renewal_notices
-        WHERE 1=1
-    """
-    params = []
-    fields = {'id','issue_date','insured','insurance_class','policy_number','expiry_date','ac_code','total_earning','renewal_premium','uploaded_by'}
+        query = """
+            SELECT id, issue_date, insured, insurance_class,
+                   policy_number, expiry_date, ac_code,
+                   total_earning, renewal_premium, uploaded_by,
+                   file_name
+            FROM renewal_notices
+            WHERE 1=1
+        """
+        params = []
+        query = _apply_filters(query, params, filters, _RN_FIELDS)
+        query += _order_clause(sort_by, sort_order, _RN_SORTABLE)
+        query = _limit_clause(query, params, limit, offset)
 
-    for f in filters:
-        if f['field'] in fields:
-            if f['op'].upper() == 'LIKE':
-                query += f" AND {f['field']} LIKE ?"
-                params.append(f"%{f['value']}%")
-            else:
-                query += f" AND {f['field']} {f['op']} ?"
-                params.append(f['value'])
+        cur.execute(query, params)
+        return _rows_to_dicts(cur)
 
-    cur.execute(query, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
 
+@functools.lru_cache(maxsize=32)
+def _fetch_renewal_notice_cached(notice_id):
+    """Fetch a single renewal notice (metadata + entries, no file_data)"""
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-def fetch_renewal_notice_by_id(notice_id):
-    """Fetch a single renewal notice (includes file_data + entries)"""
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("SELECT * FROM renewal_notices WHERE id = ?", (notice_id,))
-    notice = cur.fetchone()
-    if not notice:
-        conn.close()
-        return None
+        cur.execute("""
+            SELECT id, issue_date, insured, insurance_class,
+                   policy_number, expiry_date, ac_code,
+                   total_earning, renewal_premium,
+                   created_at, uploaded_by, file_name
+            FROM renewal_notices WHERE id = ?
+        """, (notice_id,))
+        notice = cur.fetchone()
+        if not notice:
+            raise _CacheMiss
+        notice_cols = [d[0] for d in cur.description]
 
-    cur.execute("""
-        SELECT id, label, amount
-        FROM renewal_notice_entries
-        WHERE renewal_notice_id = ?
-        ORDER BY id
-    """, (notice_id,))
-    entries = [dict(r) for r in cur.fetchall()]
+        cur.execute("""
+            SELECT id, label, amount
+            FROM renewal_notice_entries
+            WHERE renewal_notice_id = ?
+            ORDER BY id
+        """, (notice_id,))
+        entries = _rows_to_dicts(cur)
 
-    conn.close()
+        result = dict(zip(notice_cols, notice))
+        result["entries"] = entries
+        return result
 
-    result = dict(notice)
-    result["entries"] = entries
-    return result
+
+def fetch_renewal_notice_by_id(notice_id):
+    try:
+        return dict(_fetch_renewal_notice_cached(notice_id))
+    except _CacheMiss:
+        return None
 
 
 def fetch_renewal_notice_entries(notice_id, filters=None):
     if filters is None:
         filters = []
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with borrow_read() as conn:
+        cur = conn.cursor()
 
-    query = """
-        SELECT id, label, amount
-        FROM renewal_notice_entries
-        WHERE renewal_notice_id = ?
-    """
-    params = [notice_id]
-    fields = {'label','amount'}
-
-    for f in filters:
-        if f['field'] in fields:
-            if f['op'].upper() == 'LIKE':
-                query += f" AND {f['field']} LIKE ?"
-                params.append(f"%{f['value']}%")
-            else:
-                query += f" AND {f['field']} {f['op']} ?"
-                params.append(f['value'])
+        query = """
+            SELECT id, label, amount
+            FROM renewal_notice_entries
+            WHERE renewal_notice_id = ?
+        """
+        params = [notice_id]
+        query = _apply_filters(query, params, filters, _RNE_FIELDS)
 
-    cur.execute(query, params)
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+        cur.execute(query, params)
+        return _rows_to_dicts(cur)
 
 
 # ---------------- COMBINED FETCH ----------------
-def fetch_all_documents(doc_type='all', filters=None, sort_by='id', sort_order='asc'):
+def _bulk_children(table, parent_col, columns, parent_ids, filters, fields):
+    """
+    Fetch the child rows for many parents in one query, bucketed by
+    parent id — replaces the per-parent query in fetch_all_documents.
+    """
+    if not parent_ids:
+        return {}
+
+    placeholders = ",".join("?" * len(parent_ids))
+    query = (
+        f"SELECT {parent_col}, {columns} FROM {table}"
+        f" WHERE {parent_col} IN ({placeholders})"
+    )
+    params = list(parent_ids)
+    query = _apply_filters(query, params, filters, fields)
+    query += " ORDER BY id"
+
+    buckets = {}
+    with borrow_read() as conn:
+        cur = conn.execute(query, params)
+        cols = [d[0] for d in cur.description[1:]]
+        for r in cur.fetchall():
+            buckets.setdefault(r[0], []).append(dict(zip(cols, r[1:])))
+    return buckets
+
+
+def fetch_all_documents(doc_type='all', filters=None, sort_by='id', sort_order='asc',
+                        limit=None, offset=0):
     if filters is None:
         filters = []
 
-    data = []
+    # When several types are merged, any of the first offset+limit global
+    # rows must come from the first offset+limit rows of its own type, so
+    # each SQL-sorted section can be pre-limited to that bound.
+    per_type = None if limit is None else limit + offset
+
+    def _section_limit(sortable):
+        return per_type if sort_by in sortable else None
+
+    # (rows, sortable columns) per included doc type; each listing query
+    # already carries the ORDER BY when sort_by is whitelisted for it.
+    sections = []
 
     if doc_type in ('debit_note', 'all'):
-        notes = fetch_debit_notes(filters)
+        notes = fetch_debit_notes(filters, sort_by, sort_order,
+                                  limit=_section_limit(_DN_SORTABLE))
+        children = _bulk_children(
+            'debit_note_financials', 'debit_note_id',
+            'id, category, gross_premium, commission,'
+            ' overriding_insurer, cost, profit',
+            [n['id'] for n in notes], filters, _DNF_FIELDS
+        )
         for n in notes:
             n['doc_type'] = 'debit_note'
-            n['children'] = fetch_debit_note_financials(n['id'], filters)
-        data.extend(notes)
+            n['children'] = children.get(n['id'], [])
+        sections.append((notes, _DN_SORTABLE))
 
     if doc_type in ('account_statement', 'all'):
-        stmts = fetch_account_statements(filters)
+        stmts = fetch_account_statements(filters, sort_by, sort_order,
+                                         limit=_section_limit(_AS_SORTABLE))
+        children = _bulk_children(
+            'account_statement_entries', 'account_statement_id',
+            'id, effective_date, debit_note, policy_number, premium',
+            [s['id'] for s in stmts], filters, _ASE_FIELDS
+        )
         for s in stmts:
             s['doc_type'] = 'account_statement'
-            s['children'] = fetch_account_statement_entries(s['id'], filters)
-        data.extend(stmts)
+            s['children'] = children.get(s['id'], [])
+        sections.append((stmts, _AS_SORTABLE))
 
     if doc_type in ('renewal_notice', 'all'):
-        notices = fetch_renewal_notices(filters)
+        notices = fetch_renewal_notices(filters, sort_by, sort_order,
+                                        limit=_section_limit(_RN_SORTABLE))
+        children = _bulk_children(
+            'renewal_notice_entries', 'renewal_notice_id',
+            'id, label, amount',
+            [r['id'] for r in notices], filters, _RNE_FIELDS
+        )
         for r in notices:
             r['doc_type'] = 'renewal_notice'
-            r['children'] = fetch_renewal_notice_entries(r['id'], filters)
-        data.extend(notices)
+            r['children'] = children.get(r['id'], [])
+        sections.append((notices, _RN_SORTABLE))
+
+    if not sections:
+        return []
 
     reverse = sort_order == 'desc'
 
@@ -553,137 +1138,179 @@ def fetch_all_documents(doc_type='all', filters=None, sort_by='id', sort_order='
         v = d.get(sort_by)
         return (v is None, v, d.get('id', 0))
 
+    def _page(rows):
+        if limit is None:
+            return rows
+        return rows[offset:offset + limit]
+
+    if len(sections) == 1:
+        rows, sortable = sections[0]
+        if sort_by not in sortable:
+            rows.sort(key=sort_key, reverse=reverse)
+        return _page(rows)
+
+    if all(sort_by in sortable for _, sortable in sections):
+        # Each list is already SQL-sorted under the same key, so a
+        # linear merge replaces the full O(N log N) re-sort.
+        return _page(list(heapq.merge(*(rows for rows, _ in sections),
+                                      key=sort_key, reverse=reverse)))
+
+    data = [row for rows, _ in sections for row in rows]
     data.sort(key=sort_key, reverse=reverse)
-    return data
+    return _page(data)
 
 
+# Children (and the blob side-table row) go with the parent via
+# ON DELETE CASCADE; foreign_keys is asserted on every pooled connection.
 def delete_debit_note(note_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM debit_note_financials WHERE debit_note_id = ?", (note_id,))
-    cur.execute("DELETE FROM debit_notes WHERE id = ?", (note_id,))
-    conn.commit()
-    conn.close()
+    with borrow_write() as conn, tx(conn):
+        conn.execute("DELETE FROM debit_notes WHERE id = ?", (note_id,))
+    _fetch_debit_note_cached.cache_clear()
 
 def delete_account_statement(stmt_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM account_statement_entries WHERE account_statement_id = ?", (stmt_id,))
-    cur.execute("DELETE FROM account_statements WHERE id = ?", (stmt_id,))
-    conn.commit()
-    conn.close()
+    with borrow_write() as conn, tx(conn):
+        conn.execute("DELETE FROM account_statements WHERE id = ?", (stmt_id,))
+    _fetch_account_statement_cached.cache_clear()
 
 def delete_renewal_notice(notice_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM renewal_notice_entries WHERE renewal_notice_id = ?", (notice_id,))
-    cur.execute("DELETE FROM renewal_notices WHERE id = ?", (notice_id,))
-    conn.commit()
-    conn.close()
+    with borrow_write() as conn, tx(conn):
+        conn.execute("DELETE FROM renewal_notices WHERE id = ?", (notice_id,))
+    _fetch_renewal_notice_cached.cache_clear()
 
 def update_debit_note(data, financials=None):
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        UPDATE debit_notes SET
-            issue_date=?, insured_or_agent=?, insurance_class=?,
-            policy_number=?, endorsement_number=?, account_number=?,
-            uploaded_by=?, file_name=?, file_data=?
-        WHERE id=?
-    """, (
-        data['issue_date'], data.get('insured_or_agent'), data.get('insurance_class'),
-        data.get('policy_number'), data.get('endorsement_number'), data.get('account_number'),
-        data.get('uploaded_by'), data.get('file_name'), data.get('file_data'),
-        data['id']
-    ))
-
-    if financials:
-        cur.execute(
-            "DELETE FROM debit_note_financials WHERE debit_note_id=?",
-            (data['id'],)
-        )
+    with borrow_write() as conn, tx(conn):
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE debit_notes SET
+                issue_date=?, insured_or_agent=?, insurance_class=?,
+                policy_number=?, endorsement_number=?, account_number=?,
+                uploaded_by=?, file_name=?
+            WHERE id=?
+        """, (
+            data['issue_date'], data.get('insured_or_agent'), data.get('insurance_class'),
+            data.get('policy_number'), data.get('endorsement_number'), data.get('account_number'),
+            data.get('uploaded_by'), data.get('file_name'),
+            data['id']
+        ))
 
-        for f in financials:
+        if data.get('file_data') is not None:
+            cur.execute(UPSERT_DEBIT_FILE_SQL, (data['id'], data['file_data']))
+        else:
+            cur.execute("DELETE FROM debit_note_files WHERE debit_note_id=?",
+                        (data['id'],))
+
+        if financials:
+            new_rows = [
+                (data['id'], f['category'], f['gross_premium'],
+                 f['commission'], f['overriding_insurer'],
+                 f['cost'], f['profit'])
+                for f in financials
+            ]
             cur.execute("""
-                INSERT INTO debit_note_financials (
-                    debit_note_id, category, gross_premium,
-                    commission, overriding_insurer, cost, profit
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data['id'], f['category'], f['gross_premium'],
-                f['commission'], f['overriding_insurer'],
-                f['cost'], f['profit']
-            ))
-
-    conn.commit()
-    conn.close()
+                SELECT debit_note_id, category, gross_premium,
+                       commission, overriding_insurer, cost, profit
+                FROM debit_note_financials
+                WHERE debit_note_id = ?
+                ORDER BY id
+            """, (data['id'],))
+            # Metadata-only edits resubmit the same child rows; skip the
+            # delete + reinsert (and its index churn) when nothing changed.
+            # The REAL columns go through _as_real so resubmitted strings
+            # compare equal to what SQLite hands back.
+            if cur.fetchall() != [
+                r[:2] + tuple(_as_real(v) for v in r[2:]) for r in new_rows
+            ]:
+                cur.execute(
+                    "DELETE FROM debit_note_financials WHERE debit_note_id=?",
+                    (data['id'],)
+                )
+                cur.executemany(INSERT_FIN_SQL, new_rows)
+
+    _fetch_debit_note_cached.cache_clear()
 
 def update_account_statement(data, entries=None):
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        UPDATE account_statements SET
-            issue_date=?, address=?, account_number=?,
-            total_premium_due=?, premium_due_date=?,
-            uploaded_by=?, file_name=?, file_data=?
-        WHERE id=?
-    """, (
-        data['issue_date'], data.get('address'), data.get('account_number'),
-        data.get('total_premium_due'), data.get('premium_due_date'),
-        data.get('uploaded_by'), data.get('file_name'), data.get('file_data'),
-        data['id']
-    ))
-
-    # Remove old entries
-    if entries:
-        cur.execute("DELETE FROM account_statement_entries WHERE account_statement_id=?", (data['id'],))
-
-        for e in entries:
-            cur.execute("""
-                INSERT INTO account_statement_entries (
-                    account_statement_id, effective_date,
-                    debit_note, policy_number, premium
-                ) VALUES (?, ?, ?, ?, ?)
-            """, (
-                data['id'], e['effective_date'], e['debit_note'], e['policy_number'], e['premium']
-            ))
+    with borrow_write() as conn, tx(conn):
+        cur = conn.cursor()
 
-    conn.commit()
-    conn.close()
+        cur.execute("""
+            UPDATE account_statements SET
+                issue_date=?, address=?, account_number=?,
+                total_premium_due=?, premium_due_date=?,
+                uploaded_by=?, file_name=?
+            WHERE id=?
+        """, (
+            data['issue_date'], data.get('address'), data.get('account_number'),
+            data.get('total_premium_due'), data.get('premium_due_date'),
+            data.get('uploaded_by'), data.get('file_name'),
+            data['id']
+        ))
+
+        if data.get('file_data') is not None:
+            cur.execute(UPSERT_STATEMENT_FILE_SQL, (data['id'], data['file_data']))
+        else:
+            cur.execute("DELETE FROM account_statement_files WHERE account_statement_id=?",
+                        (data['id'],))
+
+        if entries:
+            new_rows = [
+                (data['id'], e['effective_date'], e['debit_note'],
+                 e['policy_number'], e['premium'])
+                for e in entries
+            ]
+            cur.execute("""
+                SELECT account_statement_id, effective_date,
+                       debit_note, policy_number, premium
+                FROM account_statement_entries
+                WHERE account_statement_id = ?
+                ORDER BY id
+            """, (data['id'],))
+            if cur.fetchall() != [r[:4] + (_as_real(r[4]),) for r in new_rows]:
+                cur.execute("DELETE FROM account_statement_entries WHERE account_statement_id=?", (data['id'],))
+                cur.executemany(INSERT_STATEMENT_ENTRY_SQL, new_rows)
+
+    _fetch_account_statement_cached.cache_clear()
 
 def update_renewal_notice(data, entries=None):
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        UPDATE renewal_notices SET
-            issue_date=?, insured=?, insurance_class=?,
-            policy_number=?, expiry_date=?, ac_code=?,
-            total_earning=?, renewal_premium=?,
-            uploaded_by=?, file_name=?, file_data=?
-        WHERE id=?
-    """, (
-        data['issue_date'], data.get('insured'), data.get('insurance_class'),
-        data.get('policy_number'), data.get('expiry_date'), data.get('ac_code'),
-        data.get('total_earning', 0), data.get('renewal_premium', 0),
-        data.get('uploaded_by'), data.get('file_name'), data.get('file_data'),
-        data['id']
-    ))
-
-    # Remove old entries
-    if entries:
-        cur.execute("DELETE FROM renewal_notice_entries WHERE renewal_notice_id=?", (data['id'],))
-
-        for e in entries:
-            cur.execute("""
-                INSERT INTO renewal_notice_entries (renewal_notice_id, label, amount)
-                VALUES (?, ?, ?)
-            """, (data['id'], e['label'], e['amount']))
+    with borrow_write() as conn, tx(conn):
+        cur = conn.cursor()
 
-    conn.commit()
-    conn.close()
+        cur.execute("""
+            UPDATE renewal_notices SET
+                issue_date=?, insured=?, insurance_class=?,
+                policy_number=?, expiry_date=?, ac_code=?,
+                total_earning=?, renewal_premium=?,
+                uploaded_by=?, file_name=?
+            WHERE id=?
+        """, (
+            data['issue_date'], data.get('insured'), data.get('insurance_class'),
+            data.get('policy_number'), data.get('expiry_date'), data.get('ac_code'),
+            data.get('total_earning', 0), data.get('renewal_premium', 0),
+            data.get('uploaded_by'), data.get('file_name'),
+            data['id']
+        ))
+
+        if data.get('file_data') is not None:
+            cur.execute(UPSERT_RENEWAL_FILE_SQL, (data['id'], data['file_data']))
+        else:
+            cur.execute("DELETE FROM renewal_notice_files WHERE renewal_notice_id=?",
+                        (data['id'],))
+
+        if entries:
+            new_rows = [
+                (data['id'], e['label'], e['amount']) for e in entries
+            ]
+            cur.execute("""
+                SELECT renewal_notice_id, label, amount
+                FROM renewal_notice_entries
+                WHERE renewal_notice_id = ?
+                ORDER BY id
+            """, (data['id'],))
+            if cur.fetchall() != [r[:2] + (_as_real(r[2]),) for r in new_rows]:
+                cur.execute("DELETE FROM renewal_notice_entries WHERE renewal_notice_id=?", (data['id'],))
+                cur.executemany(INSERT_RENEWAL_ENTRY_SQL, new_rows)
+
+    _fetch_renewal_notice_cached.cache_clear()
@@ -1,7 +1,10 @@
 from typing import Dict, List
+import math
 import re
 from datetime import datetime
 
+from ocr.parser_helpers import build_corrections
+
 # -----------------------------
 # OCR FIXES
 # -----------------------------
@@ -18,40 +21,86 @@ NUMERIC_OCR_CORRECTIONS = [
     ('7o', '70'), ('QQ', '00')
 ]
 
+_fix_text_ocr = build_corrections(TEXT_OCR_CORRECTIONS)
+_fix_numeric_ocr = build_corrections(NUMERIC_OCR_CORRECTIONS)
+
+# Patterns are compiled once at import; the bound .search/.match form
+# also skips re's internal cache lookup on every call.
+_ISSUE_DATE_RE = re.compile(
+    r'Issued Date\s*[:：]?\s*.*?(\d{1,2}\s+[A-Za-z]+\s+\d{4})',
+    re.IGNORECASE
+)
+_DATE_LINE_RE = re.compile(r'\d{1,2}\s+[A-Za-z]+\s+\d{4}')
+_ACCOUNT_RE = re.compile(r'ACCOUNT NUMBER\s*[:：]?\s*([A-Z0-9]+)', re.IGNORECASE)
+_SPACED_NUM_RE = re.compile(r'^(\d)\s+(\d{3})\s+(\d{2})$')
+# Single-character digit misreads: one C-level pass via str.translate
+# instead of a replace per character class.
+_NUM_TRANS = str.maketrans("QOl", "001")
+_WS_RE = re.compile(r"\s+")
+_NON_NUMERIC_RE = re.compile(r"[^0-9.]")
+# "contains a digit" runs per line in the entry loop; a frozenset
+# disjointness test is far cheaper than a regex search.
+_DIGITS = frozenset('0123456789')
+_POLICY_NATURE_RE = re.compile(r'([A-Za-z0-9,\-]+)\s+([\dOQol.,]+)\)', re.IGNORECASE)
+# Per-match cleanup tables for the policy/nature pairs; None deletes.
+_POLICY_TRANS = str.maketrans({' ': None, ',': None, 'o': '0', 'O': '0', 'l': '1'})
+_NATURE_TRANS = str.maketrans({'O': '0', 'Q': '0', 'o': '0', 'l': '1', ',': None})
+_DATE_RE = re.compile(r'^\d{2}/\d{2}/\d{4}$')
+_DEBIT_RE = re.compile(r'^B[\w\-?]+$', re.IGNORECASE)
+_HEADER_ENTRY_RE = re.compile(
+    r'EFFECTIVE\s+DATE\s+DEBIT\s+NOTE\s+NO\.\s*(\d{2}/\d{2}/\d{4})\s+(B[\w\-?]+)',
+    re.IGNORECASE
+)
+_BIG_ROW_RE = re.compile(r'PREM[1I]UM\s*(.*?)(?:T[O0]TAL)\s+HXS', re.DOTALL | re.IGNORECASE)
+
 def apply_ocr_corrections(text: str, numeric_only=False) -> str:
-    for wrong, correct in TEXT_OCR_CORRECTIONS:
-        text = text.replace(wrong, correct)
+    # Two stages, not one merged table: the numeric fixes must also see
+    # characters introduced by the text fixes (e.g. the O in MONGKOK).
+    text = _fix_text_ocr(text)
     if numeric_only:
-        for wrong, correct in NUMERIC_OCR_CORRECTIONS:
-            text = text.replace(wrong, correct)
+        text = _fix_numeric_ocr(text)
     return text
 
 # -----------------------------
 # DATE PARSING
 # -----------------------------
+_MONTHS = {name.lower(): i for i, name in enumerate(
+    ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+     'August', 'September', 'October', 'November', 'December'], 1)}
+
+def _parse_day_month_year(s: str) -> str:
+    """
+    Parse '5 November 2025' to '2025-11-05' without strptime, which
+    re-reads its format string and walks the locale month names on
+    every call. Raises like strptime on anything malformed.
+    """
+    day, month, year = s.split()
+    dt = datetime(int(year), _MONTHS[month.lower()], int(day))
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+
 def extract_issue_date(text: str) -> str:
-    text = apply_ocr_corrections(text)
-    m = re.search(r'Issued Date\s*[:：]?\s*.*?(\d{1,2}\s+[A-Za-z]+\s+\d{4})', text, re.IGNORECASE)
+    # Expects text already passed through apply_ocr_corrections.
+    m = _ISSUE_DATE_RE.search(text)
     if m:
         try:
-            return datetime.strptime(m.group(1), '%d %B %Y').strftime('%Y-%m-%d')
+            return _parse_day_month_year(m.group(1))
         except:
             pass
     return ''
 
 def extract_premium_due_date(text: str) -> str:
-    text = apply_ocr_corrections(text)
+    # Expects text already passed through apply_ocr_corrections.
     # find the line before "PREMIUM DUE DATE" for the date
     lines = text.splitlines()
     for i, line in enumerate(lines):
         if 'PREMIUM DUE DATE' in line.upper() and i > 0:
             date_line = lines[i-1].strip()
             try:
-                return datetime.strptime(date_line, '%d %B %Y').strftime('%Y-%m-%d')
+                return _parse_day_month_year(date_line)
             except:
                 date_line = apply_ocr_corrections(date_line)
                 try:
-                    return datetime.strptime(date_line, '%d %B %Y').strftime('%Y-%m-%d')
+                    return _parse_day_month_year(date_line)
                 except:
                     pass
     # fallback
@@ -69,7 +118,7 @@ def extract_address(text: str) -> str:
         if not line:
             continue
         # Start capturing **after the actual issue date line**
-        if re.match(r'\d{1,2}\s+[A-Za-z]+\s+\d{4}', line):
+        if _DATE_LINE_RE.match(line):
             capture = True
             continue
         # Stop capturing once we hit "EFFECTIVE DATE"
@@ -83,26 +132,25 @@ def extract_address(text: str) -> str:
 # ACCOUNT NUMBER
 # -----------------------------
 def extract_account_number(text: str) -> str:
-    text = apply_ocr_corrections(text)
-    m = re.search(r'ACCOUNT NUMBER\s*[:：]?\s*([A-Z0-9]+)', text, re.IGNORECASE)
+    # Expects text already passed through apply_ocr_corrections.
+    m = _ACCOUNT_RE.search(text)
     return m.group(1) if m else 'N/A'
 
 # ---------------------------------------
 # GLOBAL OCR CLEAN
 # ---------------------------------------
+_fix_global_ocr = build_corrections({
+    'T,': 'TJ',
+    'Tj': 'TJ',
+    't,': 'TJ',
+    'T.': 'TJ',
+    'PFF25o': 'PFF250',
+    'Ro': 'R0',
+    'Q': '0',
+})
+
 def clean_global_ocr(text):
-    replacements = {
-        'T,': 'TJ',
-        'Tj': 'TJ',
-        't,': 'TJ',
-        'T.': 'TJ',
-        'PFF25o': 'PFF250',
-        'Ro': 'R0',
-        'Q': '0',
-    }
-    for k, v in replacements.items():
-        text = text.replace(k, v)
-    return text
+    return _fix_global_ocr(text)
 
 
 # ---------------------------------------
@@ -115,7 +163,7 @@ def clean_number(raw: str):
     raw = raw.strip()
 
     # Detect spaced thousand pattern like: 1 296 20
-    spaced_match = re.match(r'^(\d)\s+(\d{3})\s+(\d{2})$', raw)
+    spaced_match = _SPACED_NUM_RE.match(raw)
     if spaced_match:
         return float(
             spaced_match.group(1)
@@ -125,18 +173,21 @@ def clean_number(raw: str):
         )
 
     # Fix OCR mistakes
-    s = raw.replace("Q", "0")
-    s = s.replace("O", "0")
-    s = s.replace("l", "1")
+    s = raw.translate(_NUM_TRANS)
+
+    # Fast path: most tokens are already a plain number once the digit
+    # misreads are fixed, so skip the regex cleanup entirely for them.
+    if s.replace('.', '', 1).isdigit():
+        return float(s)
 
     # Remove spaces
-    s = re.sub(r"\s+", "", s)
+    s = _WS_RE.sub("", s)
 
     # Remove commas
     s = s.replace(",", "")
 
     # Keep only digits and dot
-    s = re.sub(r"[^0-9.]", "", s)
+    s = _NON_NUMERIC_RE.sub("", s)
 
     try:
         return float(s)
@@ -151,38 +202,16 @@ def extract_policy_nature_pairs(big_row_text):
     pairs = []
 
     # Match: policy_token  number)
-    pattern = re.compile(
-        r'([A-Za-z0-9,\-]+)\s+([\dOQol.,]+)\)',
-        re.IGNORECASE
-    )
-
-    for match in pattern.finditer(big_row_text):
-        policy_raw = match.group(1)
-        nature_raw = match.group(2)
-
+    for match in _POLICY_NATURE_RE.finditer(big_row_text):
         # Clean policy OCR
-        policy = (
-            policy_raw
-            .replace(" ", "")
-            .replace(",", "")
-            .replace("o", "0")
-            .replace("O", "0")
-            .replace("l", "1")
-        )
-
-        # Clean nature OCR
-        nature = (
-            nature_raw
-            .replace("O", "0")
-            .replace("Q", "0")
-            .replace("o", "0")
-            .replace("l", "1")
-            .replace(",", "")
-        )
-
-        try:
-            nature = float(nature)
-        except:
+        policy = match.group(1).translate(_POLICY_TRANS)
+
+        # Clean nature OCR; the isdigit check keeps the failure path off
+        # the (expensive) exception machinery.
+        nature_clean = match.group(2).translate(_NATURE_TRANS)
+        if nature_clean.replace('.', '', 1).isdigit():
+            nature = float(nature_clean)
+        else:
             nature = 0.0
 
         pairs.append({
@@ -195,62 +224,52 @@ def extract_policy_nature_pairs(big_row_text):
 # EXTRACT DATE + DEBIT + PREMIUM (STATE PARSER)
 # ---------------------------------------
 
-def extract_header_premium_from_block(text):
+def extract_header_premium_from_block(lines):
     """
     Extract the first numeric line that comes before the first date/debit pair.
     This is the premium for the initial header entry.
     """
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    date_pattern = re.compile(r'^\d{2}/\d{2}/\d{4}$')
-    debit_pattern = re.compile(r'^B[\w\-?]+$', re.IGNORECASE)
-
     for i, line in enumerate(lines):
         # If this line is a date, we have reached structured entries
-        if date_pattern.match(line):
+        if line[0].isdigit() and _DATE_RE.match(line):
             # Look one line above for the header premium
             if i > 0:
                 prev_line = lines[i-1]
-                if re.search(r'\d', prev_line):
+                if not _DIGITS.isdisjoint(prev_line):
                     return clean_number(prev_line)
             break
 
     return 0.0
 
-def extract_header_entry(text):
+def extract_header_entry(text, lines):
     """
     Extract the very first entry in the header:
     EFFECTIVE DATE DEBIT NOTE NO. ...
     And the first premium between the header and the next debit date block.
     """
     # Find the header line
-    header_match = re.search(
-        r'EFFECTIVE\s+DATE\s+DEBIT\s+NOTE\s+NO\.\s*(\d{2}/\d{2}/\d{4})\s+(B[\w\-?]+)',
-        text,
-        re.IGNORECASE
-    )
+    header_match = _HEADER_ENTRY_RE.search(text)
     if not header_match:
         return None
 
     entry = {
         "effective_date": header_match.group(1),
         "debit_note": header_match.group(2),
-        "premium": extract_header_premium_from_block(text)
+        "premium": extract_header_premium_from_block(lines)
     }
 
     return entry
 
-def extract_date_debit_premium(text):
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
+def extract_date_debit_premium(lines):
     entries = []
 
-    date_pattern = re.compile(r'^\d{2}/\d{2}/\d{4}$')
-    debit_pattern = re.compile(r'^B[\w\-?]+$', re.IGNORECASE)
-
     i = 0
     while i < len(lines):
         line = lines[i]
 
-        if date_pattern.match(line):
+        # Date lines always start with a digit, debit lines with a B —
+        # the first-character check skips the regex on everything else.
+        if line[0].isdigit() and _DATE_RE.match(line):
 
             entry = {
                 "effective_date": line,
@@ -259,7 +278,8 @@ def extract_date_debit_premium(text):
             }
 
             # Next line should be debit
-            if i + 1 < len(lines) and debit_pattern.match(lines[i + 1]):
+            if i + 1 < len(lines) and lines[i + 1][0] in 'Bb' \
+                    and _DEBIT_RE.match(lines[i + 1]):
                 entry["debit_note"] = lines[i + 1]
                 i += 1
 
@@ -268,10 +288,10 @@ def extract_date_debit_premium(text):
                 next_line = lines[i + 1]
 
                 # If next line is NOT another date and NOT debit → treat as premium
-                if (not date_pattern.match(next_line)
-                        and not debit_pattern.match(next_line)):
+                if (not (next_line[0].isdigit() and _DATE_RE.match(next_line))
+                        and not (next_line[0] in 'Bb' and _DEBIT_RE.match(next_line))):
 
-                    if re.search(r'\d', next_line):
+                    if not _DIGITS.isdisjoint(next_line):
                         entry["premium"] = clean_number(next_line)
                         i += 1
 
@@ -287,14 +307,12 @@ def extract_date_debit_premium(text):
 # ---------------------------------------
 def parse_entries(normalized_text):
     text = clean_global_ocr(normalized_text)
+    # Split and strip once; the extractors below all share this list.
+    lines = [s for s in (l.strip() for l in text.splitlines()) if s]
     entries = []
 
     # Extract policy + nature block
-    big_row_match = re.search(
-        r'PREM[1I]UM\s*(.*?)(?:T[O0]TAL)\s+HXS',
-        text,
-        re.DOTALL | re.IGNORECASE
-    )
+    big_row_match = _BIG_ROW_RE.search(text)
 
     policy_nature_pairs = []
     if big_row_match:
@@ -304,12 +322,12 @@ def parse_entries(normalized_text):
     structured_entries = []
 
     # first header entry
-    header_entry = extract_header_entry(text)
+    header_entry = extract_header_entry(text, lines)
     if header_entry:
         structured_entries.append(header_entry)
 
     # remaining column entries
-    structured_entries.extend(extract_date_debit_premium(text))
+    structured_entries.extend(extract_date_debit_premium(lines))
 
     # Align by index
     for i in range(len(structured_entries)):
@@ -343,13 +361,10 @@ def parse_account_statement_text(raw_text: str, insured_or_agent: str = "") -> D
     account_number = extract_account_number(text)
     address = extract_address(text)
     entries = parse_entries(text)
-    total_premium_due = round(
-    sum(e['premium'] for e in entries if isinstance(e.get('premium'), (int, float))),
-    2
-)
-
-    if total_premium_due == 0.0:
-        total_premium_due = round(sum(e.get('premium', 0) for e in entries), 2)
+    # Every entry premium comes out of clean_number as a float, so one
+    # fsum covers it; fsum keeps the rounding stable when premiums span
+    # wide magnitudes.
+    total_premium_due = round(math.fsum(e['premium'] for e in entries), 2)
 
     warnings = []
     if any(not e.get('policy_number') for e in entries):
@@ -363,4 +378,4 @@ def parse_account_statement_text(raw_text: str, insured_or_agent: str = "") -> D
         'total_premium_due': total_premium_due,
         'entries': entries,
         'warnings': warnings
-    }
\ No newline at end of file
+    }
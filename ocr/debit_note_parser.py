@@ -1,48 +1,135 @@
+import functools
 import re
 from typing import Dict, List
 from datetime import datetime
+
+from ocr.parser_helpers import build_corrections
 PRIMARY_COPY = "manager"
 FALLBACK_COPY = "agent"
 
+# ==================================================
+# COMPILED PATTERNS
+# ==================================================
+# Compiled once at import; bound .search/.match skips re's per-call
+# pattern-cache lookup.
+
+_ACCT_DN_RE = re.compile(
+    r"ACC[O0Q]U?N?T\s+N[O0Q][.:;]?\s*([A-Z0-9 ()]+?)(?=\s+(POL|P0L|ENO|CLA)|\Z)",
+    re.IGNORECASE
+)
+_T01_RE = re.compile(r"\(+T01\)+")
+# Account numbers only misread these three characters; translate does
+# all of them in one pass.
+_ACC_TRANS = str.maketrans("OQS", "005")
+_CLASS_CODE_TRANS = str.maketrans("OQo", "000")
+_ACC_BASE_RE = re.compile(r"([A-Z0-9]{6,10})\s*(\(T01\))?")
+_POLICY_RE = re.compile(r"POLICY\s+N[O0Q][.:;]?\s*([A-Z0-9\-]{10,})",
+                        re.IGNORECASE | re.MULTILINE)
+_ENDORS_RE = re.compile(r"ENO+R[S5]?\s*(?:N[O0Q])?[.:;]?\s*([A-Z0-9\-_ ]+)",
+                        re.IGNORECASE)
+_ENDORS_STOP_RE = re.compile(r"(CLASS|POLICY|ACC)\b")
+_SPACE_UNDERSCORE_RE = re.compile(r"[\s_]+")
+_DASH_RUN_RE = re.compile(r"-+")
+_MONTH_NUM_RE = re.compile(
+    r"(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)([A-Z]?)(\d{1,4})"
+)
+_INSURED_RE = re.compile(r"(?:INSURED|CUSTOMER)\s+([A-Z ]{6,40})")
+_INSURED_STOP_RE = re.compile(r"\bFLAT\b|\bROOM\b|\bFLOOR\b")
+_CLASS_RE = re.compile(r"CLAS[S]?\s*([0-9OQ]{2,3})[- ]*([A-Z ]+HELPER)",
+                       re.IGNORECASE)
+_ISSUE_DATE_RE = re.compile(r"DATE[:;]?\s*(\d{1,2}\s+\w+\s+\d{4})",
+                            re.IGNORECASE | re.MULTILINE)
+_GROSS_PREMIUM_RE = re.compile(r"GROSS\s+PREMIUM", re.IGNORECASE)
+_FINANCIAL_NUM_RE = re.compile(r"\b\d{2,4}[., ]?\d{0,2}\b")
+_GROSS_PREMIUM_UPPER_RE = re.compile(r"GROSS\s+PREMIUM")
+_TEL_FAX_RE = re.compile(r"\bTEL\b|\bFAX\b")
+# All four copy stamps in one alternation: one pass over the document
+# instead of a search per copy type.
+_COPY_UNION = re.compile(
+    r"(?P<manager>MANAG[EA]R\s*C[O0]P[YV])"
+    r"|(?P<agent>AGENT\s*C[O0]P[YV])"
+    r"|(?P<account>ACCOUNT\s*C[O0]P[YV])"
+    r"|(?P<file>FILE\s*C[O0]P[YV])",
+    re.IGNORECASE
+)
+
+# One combined pass for the header fields. The scanner only matches the
+# short keyword that starts each field pattern; the full pattern is then
+# anchored at the candidate position, which keeps each field's own
+# first-match (and case) semantics while the document is walked once
+# instead of once per field.
+_HEADER_PATTERNS = {
+    "account_number": _ACCT_DN_RE,
+    "policy_number": _POLICY_RE,
+    "endorsement_number": _ENDORS_RE,
+    "insured_or_agent": _INSURED_RE,
+    "insurance_class": _CLASS_RE,
+    "issue_date": _ISSUE_DATE_RE,
+}
+_HEADER_SCANNER = re.compile(
+    r"(?P<account_number>ACC[O0Q]U?N?T\s+N[O0Q])"
+    r"|(?P<policy_number>POLICY\s+N[O0Q])"
+    r"|(?P<endorsement_number>ENO+R)"
+    r"|(?P<insured_or_agent>INSURED|CUSTOMER)"
+    r"|(?P<insurance_class>CLAS)"
+    r"|(?P<issue_date>DATE)",
+    re.IGNORECASE
+)
+
+
+def _scan_header_fields(text: str) -> Dict:
+    found = {}
+    remaining = len(_HEADER_PATTERNS)
+    for m in _HEADER_SCANNER.finditer(text):
+        kind = m.lastgroup
+        if kind in found:
+            continue
+        full = _HEADER_PATTERNS[kind].match(text, m.start())
+        if full:
+            found[kind] = full
+            remaining -= 1
+            if not remaining:
+                break
+    return found
+
 # ==================================================
 # NORMALIZATION (SAFE)
 # ==================================================
 
+_NORM_FIXES = build_corrections({
+    # insurance terms
+    "OOMEST1C": "DOMESTIC",
+    "OOMESTIC": "DOMESTIC",
+    "DQMESTIC": "DOMESTIC",
+    "XELPER": "HELPER",
+
+    # policy / account noise
+    "Roz": "R03",
+    "Ros": "R03",
+    "ROZ": "R03",
+
+    # account suffix
+    "To1": "(T01)",
+    "T01)": "(T01)",
+
+    # COPY OCR noise (IMPORTANT)
+    "CQPY": "COPY",
+    "C0PY": "COPY",
+    "COPV": "COPY",
+    "COpy": "COPY",
+    "CQRY": "COPY",
+    "CQFY": "COPY",
+})
+
+
+@functools.lru_cache(maxsize=64)
 def normalize_text(text: str) -> str:
-    replacements = {
-        # insurance terms
-        "OOMEST1C": "DOMESTIC",
-        "OOMESTIC": "DOMESTIC",
-        "DQMESTIC": "DOMESTIC",
-        "XELPER": "HELPER",
-
-        # policy / account noise
-        "Roz": "R03",
-        "Ros": "R03",
-        "ROZ": "R03",
-
-        # account suffix
-        "To1": "(T01)",
-        "T01)": "(T01)",
-
-        # COPY OCR noise (IMPORTANT)
-        "CQPY": "COPY",
-        "C0PY": "COPY",
-        "COPV": "COPY",
-        "COpy": "COPY",
-        "CQRY": "COPY",
-        "CQFY": "COPY",
-    }
+    return _NORM_FIXES(text)
 
-    for k, v in replacements.items():
-        text = text.replace(k, v)
 
-    return text
 
-
-
-def extract_first(pattern: str, text: str) -> str:
-    m = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+def extract_first(pattern: re.Pattern, text: str) -> str:
+    m = pattern.search(text)
     return m.group(1).strip() if m else ""
 
 
@@ -51,11 +138,9 @@ def extract_first(pattern: str, text: str) -> str:
 # ==================================================
 
 def extract_account_number_dn(text: str) -> str:
-    m = re.search(
-        r"ACC[O0Q]U?N?T\s+N[O0Q][.:;]?\s*([A-Z0-9 ()]+?)(?=\s+(POL|P0L|ENO|CLA)|\Z)",
-        text,
-        re.IGNORECASE
-    )
+    return _account_from_match(_ACCT_DN_RE.search(text))
+
+def _account_from_match(m) -> str:
     acc = m.group(1).strip() if m else ""
     return clean_account_number(acc)
 
@@ -65,28 +150,23 @@ def clean_account_number(acc: str) -> str:
 
     acc = acc.upper()
     # Fix common OCR mistakes
-    acc = acc.replace("O", "0").replace("Q", "0").replace("S", "5")
+    acc = acc.translate(_ACC_TRANS)
 
     # Normalize (T01)
-    acc = re.sub(r"\(+T01\)+", "(T01)", acc)
+    acc = _T01_RE.sub("(T01)", acc)
 
     # Extract base account number, add (T01) if exists
-    m = re.search(r"([A-Z0-9]{6,10})\s*(\(T01\))?", acc)
+    m = _ACC_BASE_RE.search(acc)
     return f"{m.group(1)} (T01)" if m else acc
 
 def extract_policy_number(text: str) -> str:
-    return extract_first(
-        r"POLICY\s+N[O0Q][.:;]?\s*([A-Z0-9\-]{10,})",
-        text
-    )
+    return extract_first(_POLICY_RE, text)
 
 def extract_endorsement_number_dn(text: str) -> str:
-    raw = re.search(
-        r"ENO+R[S5]?\s*(?:N[O0Q])?[.:;]?\s*([A-Z0-9\-_ ]+)",
-        text,
-        re.IGNORECASE
-    )
-    raw = raw.group(1).strip() if raw else ""
+    return _endorsement_from_match(_ENDORS_RE.search(text))
+
+def _endorsement_from_match(m) -> str:
+    raw = m.group(1).strip() if m else ""
     return clean_endorsement_number(raw)
 
 
@@ -96,45 +176,46 @@ def clean_endorsement_number(raw: str) -> str:
 
     raw = raw.upper()
     # Stop at keywords to avoid overcapture
-    raw = re.split(r"(CLASS|POLICY|ACC)\b", raw)[0]
+    m = _ENDORS_STOP_RE.search(raw)
+    if m:
+        raw = raw[:m.start()]
 
     # Remove spaces, underscores, repeated hyphens
-    raw = re.sub(r"[\s_]+", "", raw)
-    raw = re.sub(r"-+", "-", raw)
+    raw = _SPACE_UNDERSCORE_RE.sub("", raw)
+    raw = _DASH_RUN_RE.sub("-", raw)
 
     # Fix common OCR errors
     raw = raw.replace("TNOV", "NOV").replace("TNO", "NOV").replace("RNOV", "NOV")
 
     # Ensure dash between month and number if missing
-    m = re.match(r"(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)([A-Z]?)(\d{1,4})", raw)
+    m = _MONTH_NUM_RE.match(raw)
     if m:
         return f"{m.group(1)}-{m.group(2)}{m.group(3)}".replace("--", "-")
 
     return raw
 
 def extract_insured_or_agent(text: str) -> str:
-    m = re.search(
-        r"(?:INSURED|CUSTOMER)\s+([A-Z ]{6,40})",
-        text
-    )
+    return _insured_from_match(_INSURED_RE.search(text))
+
+def _insured_from_match(m) -> str:
     if not m:
         return ""
 
     name = m.group(1).strip()
     # hard stop before FLAT / ROOM / FLOOR
-    name = re.split(r"\bFLAT\b|\bROOM\b|\bFLOOR\b", name)[0]
+    stop = _INSURED_STOP_RE.search(name)
+    if stop:
+        name = name[:stop.start()]
     return name.strip()
 
 def extract_insurance_class(text: str) -> str:
-    m = re.search(
-        r"CLAS[S]?\s*([0-9OQ]{2,3})[- ]*([A-Z ]+HELPER)",
-        text,
-        re.IGNORECASE
-    )
+    return _class_from_match(_CLASS_RE.search(text))
+
+def _class_from_match(m) -> str:
     if not m:
         return ""
 
-    code = m.group(1).replace("O", "0").replace("Q", "0")
+    code = m.group(1).translate(_CLASS_CODE_TRANS)
     cls = m.group(2).upper()
     cls = cls.replace("OOMESTIC", "DOMESTIC").replace("DQMESTIC", "DOMESTIC")
     cls = cls.replace("XELPER", "HELPER")
@@ -146,29 +227,35 @@ def extract_insurance_class(text: str) -> str:
 # ==================================================
 
 def extract_manager_financials(text: str) -> List[Dict]:
-    if not re.search(r"GROSS\s+PREMIUM", text, re.IGNORECASE):
+    # The financial row sits after the last GROSS PREMIUM header, so
+    # tokenize only the tail from that anchor instead of the whole
+    # document.
+    anchor = None
+    for m in _GROSS_PREMIUM_RE.finditer(text):
+        anchor = m
+    if anchor is None:
         return []
+    tail = text[anchor.end():]
 
-    nums = re.findall(r"\b\d{2,4}[., ]?\d{0,2}\b", text)
+    # Only the last five qualifying numbers matter, so walk the matches
+    # from the end and stop as soon as five are collected instead of
+    # parsing every number on the page.
     values = []
-
-    for n in nums:
+    for n in reversed(_FINANCIAL_NUM_RE.findall(tail)):
         n = n.replace(" ", "").replace(",", ".")
         try:
             v = float(n)
-            if v > 50:
-                values.append(v)
         except:
-            pass
+            continue
+        if v > 50:
+            values.append(v)
+            if len(values) == 5:
+                break
 
     if len(values) < 5:
         return []
 
-    gross = values[-5]
-    commission = values[-4]
-    overriding = values[-3]
-    cost = values[-2]
-    profit = values[-1]
+    profit, cost, overriding, commission, gross = values
 
     copy_types = detect_copy_types(text)
     if not copy_types:
@@ -188,19 +275,7 @@ def extract_manager_financials(text: str) -> List[Dict]:
     return results
 
 def detect_copy_types(text: str) -> set[str]:
-    patterns = {
-        "manager": r"MANAG[EA]R\s*C[O0]P[YV]",
-        "agent": r"AGENT\s*C[O0]P[YV]",
-        "account": r"ACCOUNT\s*C[O0]P[YV]",
-        "file": r"FILE\s*C[O0]P[YV]",
-    }
-
-    found = set()
-    for key, pat in patterns.items():
-        if re.search(pat, text, re.IGNORECASE):
-            found.add(key)
-
-    return found
+    return {m.lastgroup for m in _COPY_UNION.finditer(text)}
 
 def split_by_copy(text: str) -> List[str]:
     blocks = []
@@ -223,11 +298,11 @@ def is_valid_financial_block(block: str) -> bool:
     b = block.upper()
 
     # must contain financial headers
-    if not re.search(r"GROSS\s+PREMIUM", b):
+    if not _GROSS_PREMIUM_UPPER_RE.search(b):
         return False
 
     # reject phone/fax heavy blocks
-    if re.search(r"\bTEL\b|\bFAX\b", b):
+    if _TEL_FAX_RE.search(b):
         return False
 
     # reject address-heavy blocks
@@ -245,29 +320,21 @@ def parse_debit_note_text(raw_text: str, insured_or_agent: str = "") -> Dict:
     text = normalize_text(raw_text)
     print("---------- NORMALIZED TEXT ----------")
     #print(text)
-    result = {
-        "account_number": extract_account_number_dn(text),
-        "policy_number": extract_policy_number(text),
-        "endorsement_number": extract_endorsement_number_dn(text),
-        "insured_or_agent": extract_insured_or_agent(text) or insured_or_agent,
-        "issue_date": extract_first(
-            r"DATE[:;]?\s*(\d{1,2}\s+\w+\s+\d{4})", text
-        ),
-        "insurance_class": extract_insurance_class(text),
+    # All header fields come out of one scanner pass over the document
+    # instead of a separate search per field.
+    fields = _scan_header_fields(text)
+
+    def _group1(kind):
+        m = fields.get(kind)
+        return m.group(1).strip() if m else ""
+
+    return {
+        "account_number": _account_from_match(fields.get("account_number")),
+        "policy_number": _group1("policy_number"),
+        "endorsement_number": _endorsement_from_match(fields.get("endorsement_number")),
+        "insured_or_agent": _insured_from_match(fields.get("insured_or_agent"))
+                            or insured_or_agent,
+        "issue_date": _group1("issue_date"),
+        "insurance_class": _class_from_match(fields.get("insurance_class")),
         "financials": extract_manager_financials(text),
     }
-    result["account_number"] = clean_account_number(
-        extract_account_number_dn(text)
-    )
-    result["insurance_class"] = (
-        result["insurance_class"]
-        .replace("0O3", "003")
-        .replace("O03", "003")
-        .replace("0o3", "003")
-    )
-
-    raw_endorsement = extract_endorsement_number_dn(text)
-    result["endorsement_number"] = clean_endorsement_number(raw_endorsement)
-
-
-    return result
@@ -2,11 +2,15 @@ from ocr.debit_note_parser import parse_debit_note_text
 from ocr.account_statement_parser import parse_account_statement_text
 from ocr.renewal_notice_parser import parse_renewal_notice_text
 
+_DISPATCH = {
+    "debit_note": parse_debit_note_text,
+    "account_statement": parse_account_statement_text,
+    "renewal_notice": parse_renewal_notice_text,
+}
+
 def parse_document(raw_text: str, doc_type: str):
-    if doc_type == "debit_note":
-        return parse_debit_note_text(raw_text)
-    if doc_type == "account_statement":
-        return parse_account_statement_text(raw_text)
-    if doc_type == "renewal_notice":
-        return parse_renewal_notice_text(raw_text)
-    raise ValueError(f"Unsupported document type: {doc_type}")
+    try:
+        parser = _DISPATCH[doc_type]
+    except KeyError:
+        raise ValueError(f"Unsupported document type: {doc_type}") from None
+    return parser(raw_text)
@@ -3,4 +3,22 @@ from typing import Dict, List
 from datetime import datetime
 
 
+def build_corrections(pairs):
+    """
+    Fold a (wrong, correct) table into one alternation regex so the text
+    is walked once instead of once per pair. Keys are sorted longest
+    first so a short key can't shadow a longer one, and the set of first
+    characters gives a cheap skip for pages with no misspellings at all.
+    """
+    table = dict(pairs)
+    pattern = re.compile('|'.join(
+        re.escape(k) for k in sorted(table, key=len, reverse=True)
+    ))
+    firsts = frozenset(k[0] for k in table)
 
+    def fix(text, _sub=pattern.sub, _table=table, _firsts=firsts):
+        if _firsts.isdisjoint(text):
+            return text
+        return _sub(lambda m: _table[m.group(0)], text)
+
+    return fix
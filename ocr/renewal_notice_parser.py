@@ -47,6 +47,9 @@ def extract_ac_code(text: str) -> str:
     return extract_first(r"ACICODE\s+([A-Z0-9]+)", text, re.IGNORECASE)
 
 
+_INSURED_NAME_STOP_RE = re.compile(r"\bROOM\b|\bBLOCK\b|\bFLAT\b|\bUNIT\b",
+                                   re.IGNORECASE)
+
 def extract_insured_name(text: str) -> str:
     start = re.search(r"\bINSURED\b", text, re.IGNORECASE)
     end = re.search(r"\bPOLICY\s*NO", text, re.IGNORECASE)
@@ -54,7 +57,9 @@ def extract_insured_name(text: str) -> str:
         return ""
     segment = text[start.end():end.start()]
     segment = re.sub(r"CLASS\s+OF\s+INSURANCE", "", segment, flags=re.IGNORECASE)
-    segment = re.split(r"\bROOM\b|\bBLOCK\b|\bFLAT\b|\bUNIT\b", segment, flags=re.IGNORECASE)[0]
+    stop = _INSURED_NAME_STOP_RE.search(segment)
+    if stop:
+        segment = segment[:stop.start()]
     return segment.strip(" {").strip()
 
 
@@ -76,6 +81,12 @@ def clean_money(raw: str) -> float:
     return float("".join(digits))
 
 
+# Splits the page once into the EMPLOYEES..TOTAL block and the TOTAL
+# tail; the entry and total extractors share the two segments instead
+# of re-anchoring on the full text.
+_EMP_TOTAL_RE = re.compile(r"(EMPLOYEES.*?)(TOTAL.*)", re.IGNORECASE | re.DOTALL)
+
+
 def extract_total_earning(text: str) -> float:
     match = re.search(r"TOTAL.*?\n(.*)", text, re.IGNORECASE)
     if not match:
@@ -91,37 +102,31 @@ def extract_renewal_premium(text: str) -> float:
 # ================================
 # RENEWAL ENTRIES
 # ================================
+# Map common OCR errors to likely digits; str.translate applies the
+# whole table in one pass instead of one replace per character.
+_OCR_DIGIT_TRANS = str.maketrans({
+    'Q': '0',
+    'o': '0',
+    'O': '0',
+    'z': '2',
+    'Z': '2',
+    'l': '1',
+    '|': '1',
+    'I': '1',
+})
+
 def fix_ocr_numbers(line: str) -> str:
     """
     Fix common OCR misreads in numeric strings.
     """
-    # Map common OCR errors to likely digits
-    corrections = {
-        'Q': '0',
-        'o': '0',
-        'O': '0',
-        'z': '2',
-        'Z': '2',
-        'l': '1',
-        '|': '1',
-        'I': '1',
-    }
-    for wrong, right in corrections.items():
-        line = line.replace(wrong, right)
-    return line
-def extract_renewal_entries(text: str) -> List[Dict]:
+    return line.translate(_OCR_DIGIT_TRANS)
+def extract_renewal_entries(block: str) -> List[Dict]:
     """
-    Extract employee entries and their earnings from OCR text.
+    Extract employee entries and their earnings from the EMPLOYEES..TOTAL
+    block of the OCR text.
     Handles collapsed lines and associates each label with the correct amount.
     """
 
-    # Extract block between EMPLOYEES and TOTAL
-    block_match = re.search(r"EMPLOYEES.*?(?=TOTAL)", text, re.IGNORECASE | re.DOTALL)
-    if not block_match:
-        return []
-
-    block = block_match.group(0)
-
     # Split block into lines
     lines = [line.strip() for line in block.split("\n") if line.strip()]
 
@@ -182,8 +187,14 @@ def parse_renewal_notice_text(raw_text: str, insured_or_agent: str = "") -> Dict
     policy_number = extract_policy_number_r(text)
     ac_code = extract_ac_code(text)
 
-    renewal_entries = extract_renewal_entries(text)
-    total_earning = extract_total_earning(text)
+    # Slice the EMPLOYEES..TOTAL region once and share the segments.
+    block_match = _EMP_TOTAL_RE.search(text)
+    if block_match:
+        renewal_entries = extract_renewal_entries(block_match.group(1))
+        total_earning = extract_total_earning(block_match.group(2))
+    else:
+        renewal_entries = []
+        total_earning = extract_total_earning(text)
     renewal_premium = extract_renewal_premium(text)
 
     return {